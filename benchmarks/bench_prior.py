@@ -0,0 +1,56 @@
+"""Benchmarks for xidplus.prior set up routines, run with python bench_prior.py"""
+import time
+import numpy as np
+import xidplus
+
+
+def synthetic_prior(nsrc, npix_per_src=250, seed=0):
+    """Create prior with random map and pointing matrix, without any WCS information
+
+    :param nsrc: number of sources
+    :param npix_per_src: number of pixels each source contributes to
+    :param seed: random seed
+    :return: xidplus.prior class
+    """
+    rng = np.random.RandomState(seed)
+    p = xidplus.prior.__new__(xidplus.prior)
+    p.nsrc = nsrc
+    p.snpix = nsrc * 10
+    p.sim = rng.normal(size=p.snpix)
+    p.snim = np.ones(p.snpix)
+    p.bkg = (-5.0, 2.0)
+    p.amat_col = np.repeat(np.arange(nsrc), npix_per_src)
+    p.amat_row = rng.randint(0, p.snpix, size=p.amat_col.size)
+    p.amat_data = rng.uniform(size=p.amat_col.size)
+    return p
+
+
+def upper_lim_map_loop(p):
+    """Original per-source implementation of xidplus.prior.upper_lim_map"""
+    prior_flux_upper = np.full((p.nsrc), 1000.0)
+    for i in range(0, p.nsrc):
+        ind = p.amat_col == i
+        if ind.sum() > 0:
+            prior_flux_upper[i] = np.max(p.sim[p.amat_row[ind]]) + (np.abs(p.bkg[0]) + 2 * p.bkg[1])
+    return prior_flux_upper
+
+
+def bench_upper_lim_map(nsrc_list=(100, 1000, 10000, 100000), max_loop_nsrc=10000):
+    print('{:>8} {:>12} {:>12}'.format('nsrc', 'loop (s)', 'vector (s)'))
+    for nsrc in nsrc_list:
+        p = synthetic_prior(nsrc)
+        t_loop = np.nan
+        if nsrc <= max_loop_nsrc:
+            t = time.time()
+            ref = upper_lim_map_loop(p)
+            t_loop = time.time() - t
+        t = time.time()
+        p.upper_lim_map()
+        t_vec = time.time() - t
+        if nsrc <= max_loop_nsrc:
+            assert np.array_equal(ref, p.prior_flux_upper)
+        print('{:>8} {:>12.4f} {:>12.4f}'.format(nsrc, t_loop, t_vec))
+
+
+if __name__ == '__main__':
+    bench_upper_lim_map()
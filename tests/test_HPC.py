@@ -0,0 +1,177 @@
+import unittest
+import os
+import pickle
+import tempfile
+import xidplus
+from xidplus import HPC, moc_routines
+import numpy as np
+
+
+def fit_mean(priors, n_cores):
+    return {'mean': [np.mean(p.sim) for p in priors], 'n_cores': n_cores}
+
+
+class samples_posterior(object):
+    def __init__(self, samples):
+        self.samples = samples
+
+
+def fit_random(priors, n_cores, nsamp=1000):
+    rng = np.random.RandomState(0)
+    return samples_posterior({'src_f': rng.uniform(size=(nsamp, len(priors), priors[0].nsrc)),
+                              'bkg': rng.normal(size=(nsamp, len(priors))),
+                              'sigma_conf': rng.uniform(size=(nsamp, len(priors)))})
+
+
+class test_local_tiling(unittest.TestCase):
+    def setUp(self):
+        priors, posterior = xidplus.load('test.pkl')
+        self.priors = priors
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        xidplus.io.pickle_dump({'priors': priors}, 'Master_prior.pkl')
+        self.order_large = 10
+        self.order = 12
+        self.tiles_large = moc_routines.get_HEALPix_pixels(self.order_large, priors[0].sra, priors[0].sdec)
+        self.tiles = moc_routines.get_HEALPix_pixels(self.order, priors[0].sra, priors[0].sdec)
+        with open('Tiles.pkl', 'wb') as f:
+            pickle.dump({'tiles': self.tiles, 'order': self.order,
+                         'tiles_large': self.tiles_large, 'order_large': self.order_large}, f)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_make_large_tiles(self):
+        failed = HPC.make_large_tiles('Master_prior.pkl', 'Tiles.pkl', n_processes=2)
+        self.assertEqual(failed, [])
+        for tile in self.tiles_large:
+            with open(HPC.tile_filename(tile, self.order_large), 'rb') as f:
+                priors = pickle.load(f)['priors']
+            self.assertEqual(len(priors), 3)
+            self.assertLess(priors[0].snpix, self.priors[0].snpix)
+
+    def test_make_large_tiles_columnar(self):
+        for p in self.priors:
+            p.sort_by_hpidx()
+        xidplus.io.save_columnar(self.priors, None, 'Master_prior')
+        failed = HPC.make_large_tiles('Master_prior', 'Tiles.pkl', n_processes=2)
+        self.assertEqual(failed, [])
+        columnar = {}
+        for tile in self.tiles_large:
+            with open(HPC.tile_filename(tile, self.order_large), 'rb') as f:
+                columnar[tile] = pickle.load(f)['priors']
+        HPC.make_large_tiles('Master_prior.pkl', 'Tiles.pkl', n_processes=2)
+        for tile in self.tiles_large:
+            with open(HPC.tile_filename(tile, self.order_large), 'rb') as f:
+                priors = pickle.load(f)['priors']
+            for p, p_columnar in zip(priors, columnar[tile]):
+                self.assertEqual(p_columnar.snpix, p.snpix)
+                self.assertEqual(sorted(p_columnar.ID), sorted(p.ID))
+                self.assertEqual(np.sort(p_columnar.sim).tolist(), np.sort(p.sim).tolist())
+
+    def test_run_tiles(self):
+        failed = HPC.run_tiles('Master_prior.pkl', 'Tiles.pkl', fit=fit_mean, n_cores_per_fit=1, n_processes=2)
+        self.assertEqual(failed, [])
+        for tile in self.tiles:
+            priors, posterior = xidplus.load(HPC.fit_filename(tile, self.order) + '.pkl')
+            self.assertEqual(posterior['n_cores'], 1)
+            self.assertTrue(hasattr(priors[0], 'amat_data'))
+
+    def test_fit_tiles_skip_large(self):
+        HPC.make_large_tiles('Master_prior.pkl', 'Tiles.pkl', n_processes=2)
+        tile_large = moc_routines.tile_in_tile(self.order, self.tiles[0], self.order_large)
+        in_large = [tile for tile in self.tiles
+                    if moc_routines.tile_in_tile(self.order, tile, self.order_large) == tile_large]
+        failed = HPC.fit_tiles('Tiles.pkl', fit=fit_mean, n_cores_per_fit=1, n_processes=2, ledger='Tiles.db',
+                               skip_large=[tile_large])
+        self.assertEqual(sorted(failed), sorted(in_large))
+        for tile in self.tiles:
+            self.assertEqual(os.path.exists(HPC.fit_filename(tile, self.order) + '.pkl'), tile not in in_large)
+        with HPC.tile_ledger('Tiles.db') as ledger:
+            self.assertEqual(ledger.tiles('fit', self.order, ('failed',)), sorted(in_large))
+            self.assertEqual(ledger.summary('fit'), {'done': len(self.tiles) - len(in_large), 'failed': len(in_large)})
+
+    def test_ledger_resume(self):
+        failed = HPC.run_tiles('Master_prior.pkl', 'Tiles.pkl', fit=fit_mean, n_cores_per_fit=1, n_processes=2,
+                               ledger='Tiles.db')
+        self.assertEqual(failed, [])
+        ledger = HPC.tile_ledger('Tiles.db')
+        self.assertEqual(ledger.tiles('fit', self.order), sorted(self.tiles))
+        self.assertEqual(ledger.summary('large'), {'done': len(self.tiles_large)})
+        ledger.set_state('fit', self.order, self.tiles[0], 'submitted')
+        ledger.close()
+        # nothing left to do, ledger is still closed
+        self.assertEqual(HPC.make_large_tiles('Master_prior.pkl', 'Tiles.pkl', ledger='Tiles.db'), [])
+        os.remove(HPC.fit_filename(self.tiles[1], self.order) + '.pkl')
+        HPC.fit_tiles('Tiles.pkl', fit=fit_mean, n_cores_per_fit=1, n_processes=2, ledger='Tiles.db')
+        self.assertTrue(os.path.exists(HPC.fit_filename(self.tiles[0], self.order) + '.pkl'))
+        # tiles marked done are not refitted
+        self.assertFalse(os.path.exists(HPC.fit_filename(self.tiles[1], self.order) + '.pkl'))
+
+    def test_ledger_failed(self):
+        HPC.make_large_tiles('Master_prior.pkl', 'Tiles.pkl', n_processes=2, ledger='Tiles.db')
+        os.remove(HPC.tile_filename(HPC.moc_routines.tile_in_tile(self.order, self.tiles[0], self.order_large),
+                                    self.order_large))
+        failed = HPC.fit_tiles('Tiles.pkl', fit=fit_mean, n_cores_per_fit=1, n_processes=2, ledger='Tiles.db')
+        self.assertIn(self.tiles[0], failed)
+        ledger = HPC.tile_ledger('Tiles.db')
+        self.assertEqual(sorted(ledger.tiles('fit', self.order, ('failed',))), sorted(failed))
+        self.assertEqual(ledger.todo('fit', self.order, retry_failed=False), [])
+        ledger.close()
+
+    def test_ledger_context_manager(self):
+        import sqlite3
+        with HPC.tile_ledger('Tiles.db') as ledger:
+            ledger.add('fit', self.order, self.tiles)
+            self.assertEqual(ledger.summary('fit'), {'pending': len(self.tiles)})
+        with self.assertRaises(sqlite3.ProgrammingError):
+            ledger.summary('fit')
+
+    def test_mosaic_tiles(self):
+        from astropy.io import fits
+        from pymoc import MOC
+        HPC.run_tiles('Master_prior.pkl', 'Tiles.pkl', fit=fit_random, n_cores_per_fit=1, n_processes=2)
+        outfiles, failed = HPC.mosaic_tiles('Tiles.pkl', nrep=20, seed=1, n_processes=2, memmap_dir='.')
+        self.assertEqual(failed, [])
+        self.assertEqual(len(outfiles), 9)
+        # core regions of tiles do not overlap, so each map pixel in the tiles is filled once
+        p = self.priors[0]
+        p.set_pixel_hpidx()
+        tiles = MOC()
+        tiles.add(self.order, self.tiles)
+        residual = fits.getdata('XID+_SPIRE_250_residual.fits', 1)
+        self.assertEqual(residual.shape, (p.imhdu['NAXIS2'], p.imhdu['NAXIS1']))
+        self.assertEqual(np.isfinite(residual).sum(),
+                         moc_routines.check_hpidx_in_moc(p.spix_hpidx, moc_routines.HPIDX_ORDER, tiles).sum())
+        maps = HPC.mosaic_tile(self.tiles[0], self.order, nrep=20, seed=1)[0]
+        self.assertTrue(np.array_equal(residual[maps['sy_pix'], maps['sx_pix']], maps['residual']))
+        pval = fits.getdata('XID+_SPIRE_250_pval.fits', 1)
+        self.assertTrue(np.array_equal(pval[maps['sy_pix'], maps['sx_pix']], maps['pval']))
+
+    def test_mosaic_tiles_few_samples(self):
+        from functools import partial
+        # tiles fitted with fewer samples than the default number of replicated maps
+        HPC.run_tiles('Master_prior.pkl', 'Tiles.pkl', fit=partial(fit_random, nsamp=100), n_cores_per_fit=1,
+                      n_processes=2)
+        outfiles, failed = HPC.mosaic_tiles('Tiles.pkl', seed=1, n_processes=2)
+        self.assertEqual(failed, [])
+        self.assertEqual(len(outfiles), 9)
+
+    def test_merge_catalogues(self):
+        from astropy.io import fits
+        HPC.run_tiles('Master_prior.pkl', 'Tiles.pkl', fit=fit_random, n_cores_per_fit=1, n_processes=2)
+        failed = HPC.merge_catalogues('Tiles.pkl', 'XID+_cat.fits', n_processes=2)
+        self.assertEqual(failed, [])
+        cat = fits.getdata('XID+_cat.fits', 1)
+        # sources in the overlap between tiles appear in several tile catalogues, but only once in merged catalogue
+        n_tile = sum(len(fits.getdata(HPC.cat_filename(tile, self.order), 1)) for tile in self.tiles)
+        self.assertGreater(n_tile, self.priors[0].nsrc)
+        self.assertEqual(sorted(cat['HELP_ID']), sorted(str(i) for i in self.priors[0].ID))
+        self.assertIn('TUCD4', fits.getheader('XID+_cat.fits', 1))
+        self.assertFalse(os.path.exists('XID+_cat.fits.rows'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import xidplus
+from xidplus import catalogue
+import numpy as np
+
+
+class test_create_SPIRE_cat(unittest.TestCase):
+    def setUp(self):
+        priors, posterior = xidplus.load('test.pkl')
+        self.priors = priors
+        self.posterior = posterior
+
+    def test_create_SPIRE_cat(self):
+        hdulist = catalogue.create_SPIRE_cat(self.posterior, *self.priors)
+        cat = hdulist[1].data
+        self.assertEqual(len(cat), self.priors[0].nsrc)
+        for b, band in enumerate(['250', '350', '500']):
+            self.assertTrue(np.allclose(cat['F_SPIRE_' + band],
+                                        np.percentile(self.posterior.samples['src_f'][:, b, :], 50.0, axis=0)))
+            self.assertTrue(np.allclose(cat['FErr_SPIRE_' + band + '_u'],
+                                        np.percentile(self.posterior.samples['src_f'][:, b, :], 84.1, axis=0)))
+            self.assertTrue(np.all((cat['Pval_res_' + band] >= 0) & (cat['Pval_res_' + band] <= 1)))
+
+    def test_create_cat(self):
+        self.posterior.samples['z'] = np.random.uniform(size=(self.posterior.samples['src_f'].shape[0],
+                                                             self.priors[0].nsrc))
+        hdulist = catalogue.create_cat(self.posterior, self.priors, ['MIPS_24', 'PACS_100', 'SPIRE_250'],
+                                       flux_unit=['muJy', 'mJy', 'mJy'], src_params=['z'])
+        cat = hdulist[1]
+        self.assertIn('F_PACS_100', cat.columns.names)
+        self.assertIn('Pval_res_24', cat.columns.names)
+        self.assertEqual(cat.columns['F_MIPS_24'].unit, 'muJy')
+        self.assertTrue(np.allclose(cat.data['z'], np.median(self.posterior.samples['z'], axis=0)))
+        for i, name in enumerate(cat.columns.names, start=1):
+            self.assertIn('TUCD{}'.format(i), cat.header)
+            self.assertIn('TDESC{}'.format(i), cat.header)
+        self.assertEqual(cat.header['TDESC4'], '24 Flux (at 50th percentile)')
+
+    def test_create_cat_few_samples(self):
+        # fewer posterior samples than the default number of replicated maps
+        for key in ['src_f', 'bkg', 'sigma_conf']:
+            self.posterior.samples[key] = self.posterior.samples[key][0:100]
+        cat = catalogue.create_SPIRE_cat(self.posterior, *self.priors)[1].data
+        self.assertEqual(len(cat), self.priors[0].nsrc)
+        self.assertTrue(np.all((cat['Pval_res_250'] >= 0) & (cat['Pval_res_250'] <= 1)))
+        cat_seed = catalogue.create_cat(self.posterior, self.priors, ['SPIRE_250', 'SPIRE_350', 'SPIRE_500'], nrep=50,
+                                        seed=2)[1].data
+        counts = cat_seed['Pval_res_250'] * 50
+        self.assertTrue(np.allclose(counts, np.rint(counts), atol=1e-4))
+
+    def test_create_cat_wrong_bands(self):
+        self.assertRaises(ValueError, lambda: catalogue.create_cat(self.posterior, self.priors, ['SPIRE_250']))
+
+
+if __name__ == '__main__':
+    unittest.main()
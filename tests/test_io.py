@@ -0,0 +1,81 @@
+import unittest
+import os
+import tempfile
+import xidplus
+import numpy as np
+
+
+class test_columnar(unittest.TestCase):
+    def setUp(self):
+        priors, posterior = xidplus.load('test.pkl')
+        self.priors = priors
+        self.posterior = posterior
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dirname = os.path.join(self.tmpdir.name, 'test')
+        xidplus.io.save_columnar(priors, posterior, self.dirname)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_load_columnar(self):
+        priors, posterior = xidplus.load(self.dirname)
+        for p, p_load in zip(self.priors, priors):
+            self.assertIsInstance(p_load, xidplus.prior)
+            self.assertEqual(sorted(p.__dict__.keys()), sorted(p_load.__dict__.keys()))
+            for key in ['sim', 'snim', 'sx_pix', 'amat_data', 'amat_row', 'amat_col', 'ID', 'prf']:
+                self.assertTrue(np.array_equal(getattr(p, key), getattr(p_load, key)))
+                self.assertEqual(getattr(p, key).dtype, getattr(p_load, key).dtype)
+            self.assertEqual(p.nsrc, p_load.nsrc)
+            self.assertEqual(p.bkg, p_load.bkg)
+            self.assertEqual(p.imhdu, p_load.imhdu)
+            self.assertEqual(p.moc, p_load.moc)
+        for key in self.posterior.samples:
+            self.assertTrue(np.array_equal(self.posterior.samples[key], posterior.samples[key]))
+        self.assertTrue(np.array_equal(self.posterior.Rhat['src_f'], posterior.Rhat['src_f']))
+
+    def test_load_columnar_values(self):
+        from collections import OrderedDict
+        values = {'int_keys': {1: (2, 3), 4: [5.0, 6]}, 'nested': {'a': [1, (2, 3)]}, 'pair': (1, 'b'),
+                  'ordered': OrderedDict([('b', 1), ('a', 2)]), 'plain': {'a': [1, 2.5, None, True]}}
+        self.posterior.__dict__.update(values)
+        xidplus.io.save_columnar(self.priors, self.posterior, self.dirname)
+        priors, posterior = xidplus.load(self.dirname)
+        for key, value in values.items():
+            self.assertEqual(getattr(posterior, key), value)
+            self.assertIs(type(getattr(posterior, key)), type(value))
+        self.assertEqual(posterior.nested['a'][1], (2, 3))
+        self.assertEqual(list(posterior.ordered.keys()), ['b', 'a'])
+
+    def test_load_columnar_bands(self):
+        priors, posterior = xidplus.io.load_columnar(self.dirname, mmap_mode='r', bands=[2])
+        self.assertEqual(len(priors), 1)
+        self.assertEqual(priors[0].snpix, self.priors[2].snpix)
+        self.assertIsInstance(priors[0].sim, np.memmap)
+        self.assertFalse(priors[0].sim.flags.writeable)
+
+    def test_copy_on_write(self):
+        priors, posterior = xidplus.load(self.dirname)
+        priors[0].sim[:] = 0.0
+        priors, posterior = xidplus.load(self.dirname)
+        self.assertTrue(np.array_equal(priors[0].sim, self.priors[0].sim))
+
+
+class test_git_version(unittest.TestCase):
+    def tearDown(self):
+        os.environ.pop('XIDPLUS_VERSION', None)
+        xidplus.io.git_version.cache_clear()
+
+    def test_git_version_memoized(self):
+        xidplus.io.git_version.cache_clear()
+        version = xidplus.io.git_version()
+        self.assertIs(xidplus.io.git_version(), version)
+        self.assertEqual(xidplus.io.git_version.cache_info().misses, 1)
+
+    def test_git_version_environment(self):
+        xidplus.io.git_version.cache_clear()
+        os.environ['XIDPLUS_VERSION'] = 'test version'
+        self.assertEqual(xidplus.io.git_version(), 'test version')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from xidplus import moc_routines
+from pymoc import MOC
+import numpy as np
+
+
+class test_check_in_moc(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(42)
+        self.ra = rng.uniform(149.0, 151.0, 10000)
+        self.dec = rng.uniform(1.0, 3.0, 10000)
+        self.moc = MOC()
+        self.moc.add(8, moc_routines.get_HEALPix_pixels(8, self.ra[0:3], self.dec[0:3]))
+        self.moc.add(11, moc_routines.get_HEALPix_pixels(11, self.ra[3:100], self.dec[3:100]))
+        self.moc.add(15, moc_routines.get_HEALPix_pixels(15, self.ra[100:1000], self.dec[100:1000]))
+
+    def test_check_in_moc(self):
+        cells = moc_routines.coords_to_hpidx(self.ra, self.dec, self.moc.order)
+        in_moc = np.in1d(cells, np.array(list(self.moc.flattened())))
+        self.assertTrue(np.array_equal(moc_routines.check_in_moc(self.ra, self.dec, self.moc), in_moc))
+        self.assertTrue(np.all(moc_routines.check_in_moc(self.ra[0:1000], self.dec[0:1000], self.moc)))
+
+    def test_check_in_moc_empty(self):
+        self.assertFalse(np.any(moc_routines.check_in_moc(self.ra, self.dec, MOC())))
+
+    def test_sorted_hpidx_in_moc(self):
+        cells = np.sort(moc_routines.coords_to_hpidx(self.ra, self.dec, moc_routines.HPIDX_ORDER))
+        index = moc_routines.sorted_hpidx_in_moc(cells, moc_routines.HPIDX_ORDER, self.moc)
+        in_moc = moc_routines.check_hpidx_in_moc(cells, moc_routines.HPIDX_ORDER, self.moc)
+        self.assertTrue(np.array_equal(index, np.flatnonzero(in_moc)))
+        self.assertEqual(moc_routines.sorted_hpidx_in_moc(cells, moc_routines.HPIDX_ORDER, MOC()).size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
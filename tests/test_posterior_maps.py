@@ -0,0 +1,83 @@
+import unittest
+import xidplus
+from xidplus import posterior_maps as postmaps
+import numpy as np
+
+
+class test_replicated_maps(unittest.TestCase):
+    def setUp(self):
+        priors, posterior = xidplus.load('test.pkl')
+        self.priors = priors
+        self.posterior = posterior
+
+    def test_replicated_maps(self):
+        rep_maps = postmaps.replicated_maps(self.priors, self.posterior, nrep=50, seed=10)
+        self.assertEqual(len(rep_maps), len(self.priors))
+        for p, rep_map in zip(self.priors, rep_maps):
+            self.assertEqual(rep_map.shape, (p.snpix, 50))
+            self.assertTrue(np.all(np.isfinite(rep_map)))
+
+    def test_replicated_maps_nrep_limited_by_samples(self):
+        samples = {key: value[0:30] for key, value in self.posterior.samples.items()}
+        self.posterior.samples = samples
+        rep_maps = postmaps.replicated_maps(self.priors, self.posterior, nrep=50, seed=10)
+        self.assertEqual(rep_maps[0].shape, (self.priors[0].snpix, 30))
+        pvals = postmaps.Bayes_Pval_res_stream(self.priors, self.posterior, nrep=50, chunk_size=7, seed=10)
+        self.assertTrue(np.all(pvals[0] <= 1.0))
+
+    def test_replicated_maps_seed(self):
+        rep_maps = postmaps.replicated_maps(self.priors, self.posterior, nrep=50, seed=10)
+        rep_maps_chunked = postmaps.replicated_maps(self.priors, self.posterior, nrep=50, seed=10, chunk_size=7)
+        for a, b in zip(rep_maps, rep_maps_chunked):
+            self.assertTrue(np.array_equal(a, b))
+
+    def test_replicated_maps_mean(self):
+        b = 0
+        rep_map = postmaps.replicated_maps(self.priors, self.posterior, nrep=1000, seed=1)[b]
+        mod_map = np.mean([postmaps.ymod_map(self.priors[b], self.posterior.samples['src_f'][i, b, :]).reshape(-1)
+                           + self.posterior.samples['bkg'][i, b] for i in range(0, 1000)], axis=0)
+        self.assertLess(np.max(np.abs(rep_map.mean(axis=1) - mod_map) / self.priors[b].snim), 0.5)
+
+
+class test_Bayesian_pvals(unittest.TestCase):
+    def setUp(self):
+        priors, posterior = xidplus.load('test.pkl')
+        self.prior = priors[0]
+        self.rep_map = postmaps.replicated_maps(priors[0:1], posterior, nrep=200, seed=3)[0]
+
+    def test_Bayesian_pvals(self):
+        pval = np.empty_like(self.prior.sim)
+        for i in range(0, self.prior.snpix):
+            pval[i] = sum(self.rep_map[i, :] < self.prior.sim[i]) / float(self.rep_map.shape[1])
+        self.assertTrue(np.array_equal(postmaps.Bayesian_pvals(self.prior, self.rep_map), pval))
+
+    def test_make_Bayesian_pval_maps(self):
+        import scipy.stats as st
+        pval = postmaps.Bayesian_pvals(self.prior, self.rep_map)
+        for i in range(0, self.prior.snpix):
+            pval[i] = st.norm.ppf(pval[i])
+        pval[np.isposinf(pval)] = 6.0
+        pval[np.isneginf(pval)] = -6.0
+        sigma = postmaps.make_Bayesian_pval_maps(self.prior, self.rep_map)
+        self.assertTrue(np.array_equal(sigma, pval))
+        self.assertTrue(np.all(np.abs(sigma) <= 6.0))
+
+    def test_Bayesian_pval_maps_stream(self):
+        priors, posterior = xidplus.load('test.pkl')
+        sigma = postmaps.Bayesian_pval_maps_stream(priors[0:1], posterior, nrep=200, chunk_size=30, seed=3)[0]
+        self.assertTrue(np.array_equal(sigma, postmaps.make_Bayesian_pval_maps(self.prior, self.rep_map)))
+
+    def test_Bayes_Pval_res(self):
+        p, rep_map = self.prior, self.rep_map
+        ref = np.empty((p.nsrc))
+        for i in range(0, p.nsrc):
+            ind = p.amat_col == i
+            t = np.sum(((rep_map[p.amat_row[ind], :] - p.sim[p.amat_row[ind], None]) / (
+                np.sqrt(2) * p.snim[p.amat_row[ind], None])) ** 2.0, axis=0)
+            ref[i] = (t / ind.sum() > 2).sum() / float(rep_map.shape[1])
+        self.assertTrue(np.allclose(postmaps.Bayes_Pval_res(p, rep_map), ref))
+        self.assertTrue(np.allclose(postmaps.Bayes_Pval_res(p, rep_map, chunk_size=7), ref))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import unittest
+import xidplus
+import numpy as np
+
+
+class test_pointing_matrix(unittest.TestCase):
+    def setUp(self):
+        priors, posterior = xidplus.load('test.pkl')
+        self.priors = priors
+
+    def test_get_pointing_matrix_matches_loop(self):
+        for p in self.priors:
+            p.get_pointing_matrix_loop()
+            amat_data, amat_row, amat_col = p.amat_data.copy(), p.amat_row.copy(), p.amat_col.copy()
+            p.get_pointing_matrix(batch_size=10)
+            self.assertTrue(np.array_equal(p.amat_data, amat_data))
+            self.assertTrue(np.array_equal(p.amat_row, amat_row))
+            self.assertTrue(np.array_equal(p.amat_col, amat_col))
+            self.assertEqual(p.amat_data.dtype, amat_data.dtype)
+            self.assertEqual(p.amat_row.dtype, amat_row.dtype)
+            self.assertEqual(p.amat_col.dtype, amat_col.dtype)
+
+    def test_pixel_index_after_set_tile(self):
+        from pymoc import MOC
+        from xidplus import moc_routines
+        p = self.priors[0]
+        self.assertTrue(np.array_equal(p.pixel_lookup(p.sx_pix, p.sy_pix), np.arange(p.snpix)))
+        tile = MOC()
+        tile.add(12, moc_routines.get_HEALPix_pixels(12, p.sra, p.sdec)[:2])
+        p.set_tile(tile)
+        self.assertTrue(np.array_equal(p.pixel_lookup(p.sx_pix, p.sy_pix), np.arange(p.snpix)))
+        self.assertEqual((p.pix_index >= 0).sum(), p.snpix)
+        self.assertEqual(p.pixel_lookup(p.sx_pix.max() + 1, p.sy_pix.max() + 1), -1)
+
+    def test_pixel_index_lazy(self):
+        from pymoc import MOC
+        from xidplus import moc_routines
+        p = self.priors[0]
+        tile = MOC()
+        tile.add(12, moc_routines.get_HEALPix_pixels(12, p.sra, p.sdec)[:2])
+        p.set_tile(tile)
+        self.assertFalse(hasattr(p, 'pix_index'))
+        p.pixel_lookup(p.sx_pix, p.sy_pix)
+        self.assertEqual(p.pix_index.shape, (p.sy_pix.max() - p.sy_pix.min() + 1, p.sx_pix.max() - p.sx_pix.min() + 1))
+
+    def test_get_pointing_matrix_unknown_psf_matches_full_scan(self):
+        from scipy import interpolate
+        p = self.priors[0]
+        p.get_pointing_matrix_unknown_psf()
+        # reference, looking at every map pixel for each source
+        paxis1 = p.prf.shape[0]
+        radius = p.pindx[-1] / 2.0
+        f = interpolate.interp1d(p.pindx[0:(paxis1 + 1) // 2], np.arange((paxis1 + 1) // 2), kind='nearest')
+        amat_data, amat_row, amat_col = [], [], []
+        for s in range(0, p.nsrc):
+            dist = np.sqrt((p.sx_pix - p.sx[s]) ** 2 + (p.sy_pix - p.sy[s]) ** 2)
+            good = dist < radius
+            if good.sum() > 0.5 * p.pindx[-1] * p.pindy[-1]:
+                amat_data.append(f(dist[good]))
+                amat_row.append(np.flatnonzero(good))
+                amat_col.append(np.full(good.sum(), s))
+        self.assertGreater(len(amat_data), 0)
+        self.assertTrue(np.array_equal(p.amat_data, np.concatenate(amat_data)))
+        self.assertTrue(np.array_equal(p.amat_row, np.concatenate(amat_row)))
+        self.assertTrue(np.array_equal(p.amat_col, np.concatenate(amat_col)))
+
+    def test_upper_lim_map(self):
+        for p in self.priors:
+            ref = np.full((p.nsrc), 1000.0)
+            for i in range(0, p.nsrc):
+                ind = p.amat_col == i
+                if ind.sum() > 0:
+                    ref[i] = np.max(p.sim[p.amat_row[ind]]) + (np.abs(p.bkg[0]) + 2 * p.bkg[1])
+            p.upper_lim_map()
+            self.assertTrue(np.array_equal(p.prior_flux_upper, ref))
+
+    def test_pointing_matrix_cache(self):
+        import pickle
+        p = self.priors[0]
+        A = p.pointing_matrix_csr()
+        self.assertIs(p.pointing_matrix_csr(), A)
+        self.assertEqual(A.shape, (p.snpix, p.nsrc))
+        self.assertTrue(np.allclose(A.toarray(), p.pointing_matrix_csc().toarray()))
+        self.assertNotIn('pointing_matrix_cache', pickle.loads(pickle.dumps(p)).__dict__)
+        p.get_pointing_matrix()
+        self.assertIsNot(p.pointing_matrix_csr(), A)
+        A = p.pointing_matrix_csr()
+        p.nsrc = p.nsrc + 1
+        self.assertIsNot(p.pointing_matrix_csr(), A)
+        p.nsrc = p.nsrc - 1
+        A = p.pointing_matrix_csr()
+        p.amat_data *= 2.0
+        self.assertTrue(np.allclose(p.pointing_matrix_csr().toarray(), 2.0 * A.toarray()))
+        A = p.pointing_matrix_csr()
+        p.amat_data[0] = 0.0
+        p.clear_pointing_matrix_cache()
+        self.assertEqual(p.pointing_matrix_csr()[p.amat_row[0], p.amat_col[0]], 0.0)
+        self.assertNotEqual(A[p.amat_row[0], p.amat_col[0]], 0.0)
+
+    def test_cut_down_map_hpidx(self):
+        from astropy import wcs
+        from pymoc import MOC
+        from xidplus import moc_routines
+        p = self.priors[1]
+        tile = MOC()
+        tile.add(13, moc_routines.get_HEALPix_pixels(13, p.sra, p.sdec)[:3])
+        ra, dec = wcs.WCS(p.imhdu).wcs_pix2world(p.sx_pix, p.sy_pix, 0)
+        in_tile = moc_routines.check_in_moc(ra, dec, p.moc.intersection(tile))
+        sx_pix, sim = p.sx_pix[in_tile], p.sim[in_tile]
+        p.set_tile(tile)
+        self.assertTrue(np.array_equal(p.sx_pix, sx_pix))
+        self.assertTrue(np.array_equal(p.sim, sim))
+        self.assertEqual(p.spix_hpidx.size, p.snpix)
+
+    def test_sort_by_hpidx(self):
+        import copy
+        from pymoc import MOC
+        from xidplus import moc_routines
+        from xidplus import posterior_maps as postmaps
+        p = self.priors[0]
+        p_sorted = copy.deepcopy(p)
+        p_sorted.sort_by_hpidx()
+        self.assertTrue(np.all(np.diff(p_sorted.spix_hpidx) >= 0))
+        self.assertTrue(np.all(np.diff(p_sorted.ssrc_hpidx) >= 0))
+        # pointing matrix is renumbered with pixels and sources
+        flux = np.arange(p.nsrc, dtype=float)
+        src_order = np.argsort(moc_routines.coords_to_hpidx(p.sra, p.sdec, moc_routines.HPIDX_ORDER), kind='stable')
+        pix_index = p.pixel_lookup(p_sorted.sx_pix, p_sorted.sy_pix)
+        self.assertTrue(np.allclose(postmaps.ymod_map(p_sorted, flux[src_order]).reshape(-1),
+                                    postmaps.ymod_map(p, flux).reshape(-1)[pix_index]))
+        tile = MOC()
+        tile.add(13, moc_routines.get_HEALPix_pixels(13, p.sra, p.sdec)[:3])
+        p.set_tile(tile)
+        p_sorted.set_tile(tile)
+        self.assertEqual(p_sorted.snpix, p.snpix)
+        self.assertEqual(sorted(p_sorted.ID), sorted(p.ID))
+        self.assertTrue(np.array_equal(p_sorted.sim, p.sim[p.pixel_lookup(p_sorted.sx_pix, p_sorted.sy_pix)]))
+
+
+
+class test_precision(unittest.TestCase):
+    def setUp(self):
+        priors, posterior = xidplus.load('test.pkl')
+        self.priors = priors
+        self.posterior = posterior
+
+    def nbytes(self, p):
+        return sum(getattr(p, key).nbytes for key in ['sim', 'snim', 'sx_pix', 'sy_pix', 'pix_index',
+                                                      'amat_data', 'amat_row', 'amat_col'])
+
+    def test_set_precision_memory(self):
+        for p in self.priors:
+            p.set_pixel_index()
+            p.get_pointing_matrix()
+            nbytes = self.nbytes(p)
+            p.set_precision('single')
+            self.assertEqual(self.nbytes(p), nbytes // 2)
+            p.get_pointing_matrix()
+            self.assertEqual(self.nbytes(p), nbytes // 2)
+            self.assertEqual(p.amat_data.dtype, np.float32)
+            self.assertEqual(p.amat_row.dtype, np.int32)
+
+    def test_set_precision_values(self):
+        from xidplus import posterior_maps as postmaps
+        p = self.priors[0]
+        p.get_pointing_matrix()
+        flux = self.posterior.samples['src_f'][0, 0, :]
+        mod_map = postmaps.ymod_map(p, flux)
+        p.set_precision('single')
+        p.get_pointing_matrix()
+        self.assertTrue(np.allclose(postmaps.ymod_map(p, flux), mod_map, rtol=1e-5))
+        from pymoc import MOC
+        from xidplus import moc_routines
+        tile = MOC()
+        tile.add(13, moc_routines.get_HEALPix_pixels(13, p.sra, p.sdec)[:3])
+        p.set_tile(tile)
+        self.assertEqual(p.sim.dtype, np.float32)
+        self.assertEqual(p.sx_pix.dtype, np.int32)
+        p.set_precision('double')
+        self.assertEqual(p.amat_data.dtype, np.float64)
+        self.assertEqual(p.amat_col.dtype, np.int64)
+        with self.assertRaises(ValueError):
+            p.set_precision('half')
+
+
+if __name__ == '__main__':
+    unittest.main()
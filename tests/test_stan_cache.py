@@ -0,0 +1,52 @@
+import unittest
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from xidplus import stan_fit
+
+
+def build_slowly():
+    time.sleep(0.5)
+    return {'pid': os.getpid()}
+
+
+def get_cached(cache_file):
+    return stan_fit.cached(cache_file, build_slowly)
+
+
+class test_stan_cache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmpdir.name, 'cache', 'model.pkl')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_model_hash(self):
+        h = stan_fit.model_hash('/XID+SPIRE')
+        self.assertEqual(h, stan_fit.model_hash('XID+SPIRE'))
+        self.assertNotEqual(h, stan_fit.model_hash('XID+PACS'))
+
+    def test_cached_concurrent(self):
+        # all jobs get the object built by the first job to take the lock
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            objs = list(executor.map(get_cached, [self.cache_file] * 4))
+        self.assertEqual(len(set(obj['pid'] for obj in objs)), 1)
+        self.assertEqual(get_cached(self.cache_file), objs[0])
+        self.assertEqual([f for f in os.listdir(os.path.dirname(self.cache_file)) if f.endswith('.tmp')], [])
+
+    def test_cached_stale(self):
+        # cache files that cannot be unpickled, e.g. referring to a module that is no longer installed, are rebuilt
+        os.makedirs(os.path.dirname(self.cache_file))
+        for stale in [b'cnot_a_module\nmodel\n.', b'not a pickle']:
+            with open(self.cache_file, 'wb') as f:
+                f.write(stale)
+            self.assertEqual(get_cached(self.cache_file), {'pid': os.getpid()})
+            with open(self.cache_file, 'rb') as f:
+                self.assertEqual(pickle.load(f), {'pid': os.getpid()})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import xidplus
+from xidplus import laplace_fit
+import numpy as np
+
+
+class test_laplace_fit(unittest.TestCase):
+    def setUp(self):
+        priors, posterior = xidplus.load('test.pkl')
+        self.priors = priors
+        self.posterior = posterior
+
+    def test_fit_band_bounds(self):
+        p = self.priors[0]
+        x, sigma_conf, M = laplace_fit.fit_band(p)
+        self.assertEqual(x.shape, (p.nsrc + 1,))
+        self.assertEqual(M.shape, (p.snpix + 1, p.nsrc + 1))
+        self.assertTrue(np.all(x[0:p.nsrc] >= p.prior_flux_lower))
+        self.assertTrue(np.all(x[0:p.nsrc] <= p.prior_flux_upper))
+        self.assertGreaterEqual(sigma_conf, 0.0)
+
+    def test_fit_band_n_iter(self):
+        p = self.priors[0]
+        with self.assertRaises(ValueError):
+            laplace_fit.fit_band(p, n_iter=0)
+        # n_iter is not used when sigma_conf is given
+        x, sigma_conf, M = laplace_fit.fit_band(p, sigma_conf=1.0, n_iter=0)
+        self.assertEqual(sigma_conf, 1.0)
+
+    def test_fit_band_noiseless(self):
+        # with no noise and no confusion, the fit reproduces the map (fluxes of blended sources are degenerate)
+        p = self.priors[0]
+        flux = self.posterior.samples['src_f'][0, 0, :]
+        p.sim = p.pointing_matrix_csr() @ flux + p.bkg[0]
+        p.snim = np.full(p.snpix, 1e-3)
+        p.prior_flux_upper = np.full(p.nsrc, 1000.0)
+        x, sigma_conf, M = laplace_fit.fit_band(p, sigma_conf=0.0)
+        self.assertTrue(np.allclose(p.pointing_matrix_csr() @ x[0:p.nsrc] + x[-1], p.sim, atol=0.05))
+        self.assertAlmostEqual(x[-1], p.bkg[0], places=2)
+
+    def test_laplace_samples_covariance(self):
+        # samples from the sparse square root form have the covariance of the dense inverse Hessian
+        p = self.priors[2]
+        p.prior_flux_lower = np.full(p.nsrc, -1e4)
+        p.prior_flux_upper = np.full(p.nsrc, 1e4)
+        x, sigma_conf, M = laplace_fit.fit_band(p, sigma_conf=1.0)
+        src_f, bkg = laplace_fit.laplace_samples(p, x, M, nsamp=20000, rng=np.random.default_rng(1))
+        H = (M.T @ M).toarray()
+        H[np.arange(p.nsrc), np.arange(p.nsrc)] += 12.0 / (2e4) ** 2
+        sd = np.sqrt(np.diag(np.linalg.inv(H)))
+        self.assertTrue(np.allclose(np.std(src_f, axis=0), sd[0:p.nsrc], rtol=0.05))
+        self.assertAlmostEqual(np.std(bkg) / sd[-1], 1.0, places=1)
+        self.assertTrue(np.allclose(np.mean(src_f, axis=0), x[0:p.nsrc], atol=0.05 * sd.max()))
+
+    def test_all_bands(self):
+        fit = laplace_fit.all_bands(self.priors, nsamp=200, seed=1)
+        posterior = xidplus.posterior_laplace(fit, self.priors)
+        nband, nsrc = len(self.priors), self.priors[0].nsrc
+        self.assertEqual(posterior.samples['src_f'].shape, (200, nband, nsrc))
+        self.assertEqual(posterior.samples['bkg'].shape, (200, nband))
+        self.assertEqual(posterior.samples['sigma_conf'].shape, (200, nband))
+        self.assertEqual(posterior.map['src_f'].shape, (nband, nsrc))
+        for b, p in enumerate(self.priors):
+            self.assertTrue(np.all(posterior.samples['src_f'][:, b, :] >= p.prior_flux_lower))
+            self.assertTrue(np.all(posterior.samples['src_f'][:, b, :] <= p.prior_flux_upper))
+        # close to MCMC fit
+        self.assertGreater(np.corrcoef(np.median(posterior.samples['src_f'], axis=0).ravel(),
+                                       np.median(self.posterior.samples['src_f'], axis=0).ravel())[0, 1], 0.8)
+        self.assertTrue(np.allclose(np.median(posterior.samples['bkg'], axis=0),
+                                    np.median(self.posterior.samples['bkg'], axis=0), atol=2.0))
+        fit_seed = laplace_fit.all_bands(self.priors, nsamp=200, seed=1)
+        self.assertTrue(np.array_equal(fit['samples']['src_f'], fit_seed['samples']['src_f']))
+
+    def test_catalogue(self):
+        from xidplus import catalogue
+        fit = laplace_fit.all_bands(self.priors, nsamp=1000, sigma_conf=1.0, seed=1)
+        posterior = xidplus.posterior_laplace(fit, self.priors)
+        self.assertTrue(np.all(posterior.samples['sigma_conf'] == 1.0))
+        cat = catalogue.create_SPIRE_cat(posterior, *self.priors)
+        self.assertEqual(len(cat[1].data), self.priors[0].nsrc)
+        self.assertNotIn('Rhat_SPIRE_250', cat[1].columns.names)
+
+
+if __name__ == '__main__':
+    unittest.main()
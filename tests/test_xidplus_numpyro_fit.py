@@ -5,6 +5,7 @@ from numpyro.infer import MCMC, NUTS, Predictive
 from jax import random
 import numpy as np
 import numpyro
+import jax
 
 class test_all_bands(unittest.TestCase):
     def setUp(self):
@@ -27,6 +28,101 @@ class test_all_bands(unittest.TestCase):
         posterior_numpyro=xidplus.posterior_numpyro(fit,self.priors)
         self.assertAlmostEqual(np.mean(posterior_numpyro.samples['bkg']),np.mean(self.posterior.samples['bkg']),places=0)
 
+    def test_check_chain_method(self):
+        from xidplus.numpyro_fit import check_chain_method
+        n_devices = jax.local_device_count()
+        self.assertEqual(check_chain_method(n_devices, 'parallel'), 'parallel')
+        with self.assertWarns(UserWarning):
+            self.assertEqual(check_chain_method(n_devices + 1, 'parallel'), 'sequential')
+        self.assertEqual(check_chain_method(n_devices + 1, 'vectorized'), 'vectorized')
+
+
+class test_generic(unittest.TestCase):
+    def setUp(self):
+        priors, posterior = xidplus.load('test.pkl')
+        self.priors = priors
+        self.posterior = posterior
+
+    def test_fused_pointing_matrix(self):
+        from xidplus.numpyro_fit import generic
+        from scipy.sparse import coo_matrix
+        rows, cols, values, pix_band = generic.fused_pointing_matrix(self.priors)
+        npix = sum(p.snpix for p in self.priors)
+        A = coo_matrix((values, (rows, cols)), shape=(npix, len(self.priors) * self.priors[0].nsrc))
+        f = self.posterior.samples['src_f'][0, :, :]
+        mod_map = np.concatenate([p.pointing_matrix_csr() @ f[b, :] for b, p in enumerate(self.priors)])
+        self.assertTrue(np.allclose(A @ f.reshape(-1), mod_map))
+        self.assertTrue(np.array_equal(np.bincount(pix_band), [p.snpix for p in self.priors]))
+
+    def test_prepare_data(self):
+        from xidplus.numpyro_fit import generic
+        data = generic.prepare_data(self.priors)
+        self.assertEqual(data.sim.shape, (sum(p.snpix for p in self.priors),))
+        self.assertEqual(data.flux_lower.shape, (self.priors[0].nsrc, len(self.priors)))
+        self.assertEqual(len(jax.tree_util.tree_leaves(data)), len(generic.model_data._fields))
+
+    def test_bucket_log_density(self):
+        from xidplus.numpyro_fit import generic
+        from numpyro.infer.util import log_density
+        data = generic.prepare_data(self.priors)
+        data_pad = generic.prepare_data(self.priors, bucket=True)
+        nsrc, nsrc_pad = data.flux_lower.shape[0], data_pad.flux_lower.shape[0]
+        self.assertEqual(nsrc_pad, generic.bucket_size(nsrc))
+        self.assertEqual(data_pad.sim.shape[0], generic.bucket_size(data.sim.shape[0]))
+        params = {'src_f': np.asarray(data.flux_lower + 0.5 * (data.flux_upper - data.flux_lower)),
+                  'bkg': np.asarray(data.bkg_mu), 'sigma_conf': np.ones(len(self.priors))}
+        params_pad = dict(params, src_f=np.concatenate([params['src_f'],
+                                                        np.full((nsrc_pad - nsrc, len(self.priors)), 0.5)]))
+        # padding sources have uniform(0, 1) priors, so add nothing to log density
+        self.assertAlmostEqual(float(log_density(generic.multi_band_model, (data,), {}, params)[0]),
+                               float(log_density(generic.multi_band_model, (data_pad,), {}, params_pad)[0]),
+                               places=1)
+
+    def test_all_bands_bucket(self):
+        from xidplus.numpyro_fit import generic
+        fit = generic.all_bands(self.priors, num_samples=100, num_warmup=100, bucket=True)
+        posterior = generic.get_posterior(fit, self.priors)
+        self.assertEqual(posterior.samples['src_f'].shape[1:], (len(self.priors), self.priors[0].nsrc))
+        self.assertEqual(posterior.Rhat['src_f'].shape, (self.priors[0].nsrc, len(self.priors)))
+
+    def test_all_tiles(self):
+        import copy
+        from pymoc import MOC
+        from xidplus import moc_routines
+        from xidplus.numpyro_fit import generic
+        tile = MOC()
+        tile.add(12, moc_routines.get_HEALPix_pixels(12, self.priors[0].sra, self.priors[0].sdec)[:2])
+        small_tile = copy.deepcopy(self.priors)
+        for p in small_tile:
+            p.set_tile(tile)
+            p.get_pointing_matrix()
+        posteriors = generic.all_tiles([self.priors, small_tile], num_samples=100, num_warmup=100, num_chains=2)
+        self.assertEqual(len(posteriors), 2)
+        for priors, posterior in zip([self.priors, small_tile], posteriors):
+            self.assertEqual(posterior.samples['src_f'].shape, (200, len(priors), priors[0].nsrc))
+            self.assertEqual(posterior.samples['bkg'].shape, (200, len(priors)))
+            self.assertEqual(posterior.Rhat['src_f'].shape, (priors[0].nsrc, len(priors)))
+
+    def test_all_bands_single_band(self):
+        from xidplus.numpyro_fit import generic
+        from xidplus import catalogue
+        priors = self.priors[0:1]
+        fit = generic.all_bands(priors, num_samples=100, num_warmup=100, num_chains=1)
+        posterior = generic.get_posterior(fit, priors)
+        self.assertEqual(posterior.samples['src_f'].shape, (100, 1, priors[0].nsrc))
+        self.assertEqual(posterior.samples['bkg'].shape, (100, 1))
+        self.assertEqual(posterior.samples['sigma_conf'].shape, (100, 1))
+        cat = catalogue.create_cat(posterior, priors, ['SPIRE_250'], nrep=100, seed=1)
+        self.assertEqual(len(cat[1].data), priors[0].nsrc)
+
+    def test_all_bands(self):
+        from xidplus.numpyro_fit import generic
+        fit = generic.all_bands(self.priors)
+        posterior_numpyro = xidplus.posterior_numpyro(fit, self.priors)
+        self.assertEqual(posterior_numpyro.samples['src_f'].shape[1:], (len(self.priors), self.priors[0].nsrc))
+        self.assertAlmostEqual(np.mean(posterior_numpyro.samples['bkg']), np.mean(self.posterior.samples['bkg']),
+                               places=0)
+
 
 if __name__ == '__main__':
     unittest.main()
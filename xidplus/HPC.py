@@ -1,7 +1,10 @@
 import sys
 import os
+import copy
+import time
 import numpy as np
 from xidplus import moc_routines
+from xidplus import posterior_maps as postmaps
 from builtins import input
 import pickle
 import xidplus
@@ -13,13 +16,13 @@ def hierarchical_tile(masterfile,tilefile):
     """
     Create Hierarchical tile from Master prior
 
-    :param masterfile: Master prior file
+    :param masterfile: Master prior file or directory (see load_master)
     :param tilefile:  File containing Tiling scheme
     """
     try:
-        taskid = np.int(os.environ['SGE_TASK_ID'])
-        task_first=np.int(os.environ['SGE_TASK_FIRST'])
-        task_last=np.int(os.environ['SGE_TASK_LAST'])
+        taskid = int(os.environ['SGE_TASK_ID'])
+        task_first=int(os.environ['SGE_TASK_FIRST'])
+        task_last=int(os.environ['SGE_TASK_LAST'])
 
     except KeyError:
         print("Error: could not read SGE_TASK_ID from environment")
@@ -30,19 +33,588 @@ def hierarchical_tile(masterfile,tilefile):
     with open(tilefile, 'rb') as f:
         obj = pickle.load(f)
 
-    tiles = obj['tiles']
-    order = obj['order']
     tiles_large = obj['tiles_large']
     order_large = obj['order_large']
 
-    obj=xidplus.io.pickle_load(masterfile)
-    priors = obj['priors']
+    priors = load_master(masterfile)
 
-    moc = moc_routines.get_fitting_region(order_large, tiles_large[taskid - 1])
-    for p in priors:
+    cut_tile(priors, order_large, tiles_large[taskid - 1])
+
+
+def load_master(masterfile):
+    """Load Master prior, either a pickle file or a directory saved with xidplus.io.save_columnar. Directories are
+    memory mapped, so if the priors have been sorted (see xidplus.prior.sort_by_hpidx) only the parts of the map and
+    catalogue in a tile are read when cutting it
+
+    :param masterfile: Master prior file or directory
+    :return: list of xidplus.prior classes
+    """
+    if os.path.isdir(masterfile):
+        return xidplus.io.load_columnar(masterfile, mmap_mode='r')[0]
+    return xidplus.io.pickle_load(masterfile)['priors']
+
+
+def tile_filename(tile, order):
+    """Filename of cut down priors for a tile
+
+    :param tile: HEALPix pixel of tile
+    :param order: order of tile
+    :return: filename
+    """
+    return 'Tile_'+ str(tile) + '_' + str(order) + '.pkl'
+
+
+def fit_filename(tile, order):
+    """Filename (without .pkl extension, see xidplus.io.save) of fitted priors and posterior for a tile
+
+    :param tile: HEALPix pixel of tile
+    :param order: order of tile
+    :return: filename
+    """
+    return 'Fit_' + str(tile) + '_' + str(order)
+
+
+def cut_tile(priors, order, tile):
+    """
+    Cut priors down to the fitting region of a tile and save them
+
+    :param priors: list of xidplus.prior classes, left unchanged
+    :param order: order of tile
+    :param tile: HEALPix pixel of tile
+    :return: filename of saved priors
+    """
+    moc = moc_routines.get_fitting_region(order, tile)
+    # cutting down replaces rather than modifies the prior arrays, so a shallow copy leaves the input priors intact
+    tile_priors = [copy.copy(p) for p in priors]
+    for p in tile_priors:
         p.moc = moc
         p.cut_down_prior()
 
-    outfile = 'Tile_'+ str(tiles_large[taskid - 1]) + '_' + str(order_large) + '.pkl'
+    outfile = tile_filename(tile, order)
     with open(outfile, 'wb') as f:
-        pickle.dump({'priors':priors, 'version':xidplus.io.git_version()}, f)
\ No newline at end of file
+        pickle.dump({'priors':tile_priors, 'version':xidplus.io.git_version()}, f)
+    return outfile
+
+
+def fit_SPIRE_stan(priors, n_cores):
+    """Default fit for fit_tiles: fit the three SPIRE bands with stan, one chain per core
+
+    :param priors: list of xidplus.prior classes (250, 350, 500)
+    :param n_cores: number of cores
+    :return: xidplus.posterior_stan class
+    """
+    from xidplus.stan_fit import SPIRE
+    fit = SPIRE.all_bands(*priors, chains=n_cores, n_jobs=n_cores)
+    return xidplus.posterior_stan(fit, priors)
+
+
+def fit_tile(tile, order, order_large, fit=fit_SPIRE_stan, n_cores=4):
+    """
+    Fit a small tile, reading the priors from the large tile it is in and saving priors and posterior
+
+    :param tile: HEALPix pixel of small tile
+    :param order: order of small tile
+    :param order_large: order of large tiles
+    :param fit: function taking (priors, n_cores) and returning posterior class
+    :param n_cores: number of cores used by fit
+    :return: filename of saved priors and posterior, convergence summary (see convergence)
+    """
+    tile_large = moc_routines.tile_in_tile(order, tile, order_large)
+    with open(tile_filename(tile_large, order_large), 'rb') as f:
+        priors = pickle.load(f)['priors']
+
+    moc = moc_routines.get_fitting_region(order, tile)
+    for p in priors:
+        p.moc = moc
+        p.cut_down_prior()
+        p.get_pointing_matrix()
+        p.upper_lim_map()
+
+    posterior = fit(priors, n_cores)
+    outfile = fit_filename(tile, order)
+    xidplus.io.save(priors, posterior, outfile)
+    return outfile, convergence(posterior)
+
+
+def convergence(posterior):
+    """Summarise convergence of fit
+
+    :param posterior: xidplus.posterior class
+    :return: dictionary with maximum Rhat and minimum n_eff of source fluxes (None if not available from posterior)
+    """
+    summary = {'max_rhat': None, 'min_n_eff': None}
+    if hasattr(posterior, 'Rhat'):
+        summary['max_rhat'] = float(np.nanmax(posterior.Rhat['src_f']))
+    if hasattr(posterior, 'n_eff'):
+        summary['min_n_eff'] = float(np.nanmin(posterior.n_eff['src_f']))
+    return summary
+
+
+class tile_ledger(object):
+    def __init__(self, filename):
+        """ Persistent record (SQLite database) of the state of each tile in a tiling run, so a crashed or
+        preempted run can be resumed without redoing finished tiles. Each tile is pending, submitted (queued or running
+        in a worker), done or failed. Only one run should use a ledger at a time. Can be used as a context manager,
+        closing the database on exit.
+
+        :param filename: database file, created if it does not exist
+        """
+        import sqlite3
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS tiles ("
+                              "stage TEXT, tile_order INTEGER, tile INTEGER, state TEXT, "
+                              "wall_time REAL, max_rhat REAL, min_n_eff REAL, error TEXT, updated REAL, "
+                              "PRIMARY KEY (stage, tile_order, tile))")
+
+    def add(self, stage, order, tiles):
+        """Add tiles as pending, leaving tiles already in the ledger unchanged
+
+        :param stage: stage of run, e.g. 'large' or 'fit'
+        :param order: order of tiles
+        :param tiles: HEALPix pixels of tiles
+        """
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO tiles (stage, tile_order, tile, state, updated) "
+                                  "VALUES (?, ?, ?, 'pending', ?)",
+                                  [(stage, int(order), int(tile), time.time()) for tile in tiles])
+
+    def todo(self, stage, order, retry_failed=True):
+        """Tiles still to be run. Tiles left submitted by a previous run (that must have stopped) are included
+
+        :param stage: stage of run
+        :param order: order of tiles
+        :param retry_failed: include failed tiles
+        :return: list of tiles
+        """
+        states = ('pending', 'submitted', 'failed') if retry_failed else ('pending', 'submitted')
+        return self.tiles(stage, order, states)
+
+    def tiles(self, stage, order, states=('done',)):
+        """Tiles in given states
+
+        :param stage: stage of run
+        :param order: order of tiles
+        :param states: tuple of states
+        :return: list of tiles
+        """
+        rows = self.conn.execute("SELECT tile FROM tiles WHERE stage = ? AND tile_order = ? AND state IN ({}) "
+                                 "ORDER BY tile".format(','.join('?' * len(states))),
+                                 (stage, int(order)) + tuple(states))
+        return [row[0] for row in rows]
+
+    def set_state(self, stage, order, tile, state, wall_time=None, max_rhat=None, min_n_eff=None, error=None):
+        """Update state of tile
+
+        :param stage: stage of run
+        :param order: order of tiles
+        :param tile: HEALPix pixel of tile
+        :param state: 'pending', 'submitted', 'done' or 'failed'
+        :param wall_time: wall time in seconds
+        :param max_rhat: maximum Rhat of fit
+        :param min_n_eff: minimum n_eff of fit
+        :param error: error message for failed tiles
+        """
+        with self.conn:
+            self.conn.execute("UPDATE tiles SET state = ?, wall_time = ?, max_rhat = ?, min_n_eff = ?, error = ?, "
+                              "updated = ? WHERE stage = ? AND tile_order = ? AND tile = ?",
+                              (state, wall_time, max_rhat, min_n_eff, error, time.time(),
+                               stage, int(order), int(tile)))
+
+    def summary(self, stage):
+        """Number of tiles in each state
+
+        :param stage: stage of run
+        :return: dictionary of state: number of tiles
+        """
+        rows = self.conn.execute("SELECT state, COUNT(*) FROM tiles WHERE stage = ? GROUP BY state", (stage,))
+        return dict(rows.fetchall())
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _init_cut_worker(priors):
+    global _master_priors
+    # memory mapped master priors are opened in each worker rather than copied to it
+    if isinstance(priors, str):
+        priors = load_master(priors)
+    _master_priors = priors
+
+
+def _cut_worker(order, tile):
+    return cut_tile(_master_priors, order, tile), {}
+
+
+def _fit_worker(tile, order, order_large, fit, n_cores):
+    return fit_tile(tile, order, order_large, fit, n_cores)
+
+
+def _timed(func, *args):
+    """Run func in worker, timing it and catching any error
+
+    :return: dictionary with result (output filename, convergence summary), wall time and error
+    """
+    start = time.time()
+    try:
+        result, error = func(*args), None
+    except Exception as e:
+        result, error = None, repr(e)
+    return {'result': result, 'wall_time': time.time() - start, 'error': error}
+
+
+def make_large_tiles(masterfile, tilefile, n_processes=None, ledger=None):
+    """
+    Create all large (hierarchical) tiles from Master prior on the local machine. The Master prior is read once and
+    tiles are cut and saved in parallel.
+
+    :param masterfile: Master prior file or directory (see load_master)
+    :param tilefile:  File containing Tiling scheme
+    :param n_processes: number of processes (default is number of cores)
+    :param ledger: (default=None) tile ledger file. If given, tiles already done are skipped
+    :return: list of large tiles that failed
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    with open(tilefile, 'rb') as f:
+        obj = pickle.load(f)
+    tiles_large = obj['tiles_large']
+    order_large = obj['order_large']
+
+    with _open_ledger(ledger, 'large', order_large, tiles_large) as ledger:
+        if ledger is not None:
+            tiles_large = ledger.todo('large', order_large)
+            if len(tiles_large) == 0:
+                return []
+
+        priors = masterfile if os.path.isdir(masterfile) else load_master(masterfile)
+        with ProcessPoolExecutor(max_workers=n_processes, initializer=_init_cut_worker,
+                                 initargs=(priors,)) as executor:
+            futures = {}
+            for tile in tiles_large:
+                futures[executor.submit(_timed, _cut_worker, order_large, tile)] = tile
+                if ledger is not None:
+                    ledger.set_state('large', order_large, tile, 'submitted')
+            return _wait(futures, 'large tiles', ledger, 'large', order_large)
+
+
+def fit_tiles(tilefile, fit=fit_SPIRE_stan, n_cores_per_fit=4, n_processes=None, ledger=None, skip_large=()):
+    """
+    Fit all small tiles on the local machine, running several fits at once
+
+    :param tilefile:  File containing Tiling scheme
+    :param fit: function taking (priors, n_cores) and returning posterior class. Must be defined at module level
+    :param n_cores_per_fit: number of cores given to each fit (e.g. one per MCMC chain)
+    :param n_processes: number of fits run at once (default is number of cores / n_cores_per_fit)
+    :param ledger: (default=None) tile ledger file. If given, tiles already done are skipped and wall time and
+        convergence of each fit are recorded
+    :param skip_large: (default=()) large tiles that could not be created; the small tiles in them are not fitted and
+        are reported as failed
+    :return: list of small tiles that failed
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    with open(tilefile, 'rb') as f:
+        obj = pickle.load(f)
+    tiles = obj['tiles']
+    order = obj['order']
+    order_large = obj['order_large']
+
+    with _open_ledger(ledger, 'fit', order, tiles) as ledger:
+        if ledger is not None:
+            tiles = ledger.todo('fit', order)
+
+        skipped = [tile for tile in tiles if moc_routines.tile_in_tile(order, tile, order_large) in set(skip_large)]
+        if len(skipped) > 0:
+            print("Skipping {} tiles in large tiles that failed: {}".format(len(skipped), skipped))
+            tiles = [tile for tile in tiles if tile not in set(skipped)]
+            if ledger is not None:
+                for tile in skipped:
+                    ledger.set_state('fit', order, tile, 'failed', error='large tile failed')
+
+        if n_processes is None:
+            n_processes = max(1, os.cpu_count() // n_cores_per_fit)
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            futures = {}
+            for tile in tiles:
+                futures[executor.submit(_timed, _fit_worker, tile, order, order_large, fit, n_cores_per_fit)] = tile
+                if ledger is not None:
+                    ledger.set_state('fit', order, tile, 'submitted')
+            return skipped + _wait(futures, 'tiles fitted', ledger, 'fit', order)
+
+
+def run_tiles(masterfile, tilefile, fit=fit_SPIRE_stan, n_cores_per_fit=4, n_processes=None, ledger=None):
+    """
+    Run the hierarchical tiling scheme on the local machine, without a batch system: create the large tiles from the
+    Master prior and then fit all the small tiles.
+
+    :param masterfile: Master prior file or directory (see load_master)
+    :param tilefile:  File containing Tiling scheme
+    :param fit: function taking (priors, n_cores) and returning posterior class. Must be defined at module level
+    :param n_cores_per_fit: number of cores given to each fit
+    :param n_processes: number of processes used to create large tiles (default is number of cores)
+    :param ledger: (default=None) tile ledger file. If given, the run can be restarted and will resume where it stopped
+    :return: list of small tiles that failed, including those not fitted because their large tile failed
+    """
+    failed_large = make_large_tiles(masterfile, tilefile, n_processes=n_processes, ledger=ledger)
+    if len(failed_large) > 0:
+        print("{} large tiles failed: {}".format(len(failed_large), failed_large))
+    return fit_tiles(tilefile, fit=fit, n_cores_per_fit=n_cores_per_fit, ledger=ledger, skip_large=failed_large)
+
+
+def mosaic_tile(tile, order, nrep=1000, chunk_size=100, seed=None):
+    """
+    Bayesian maps for the core region of a fitted tile, i.e. the pixels in the tile itself rather than its padded
+    fitting region, so that maps from neighbouring tiles do not overlap
+
+    :param tile: HEALPix pixel of small tile
+    :param order: order of small tile
+    :param nrep: number of replicated maps used for Bayesian P value maps, at most the number of posterior samples of
+        each tile (see xidplus.posterior_maps.n_replicates)
+    :param chunk_size: number of replicated maps generated at once
+    :param seed: (default=None) seed for noise, combined with tile so each tile has its own noise
+    :return: list, one for each band, of dictionaries with pixel positions (sx_pix, sy_pix) and 'model' (posterior
+        median fluxes and background), 'residual' (map minus model) and 'pval' (Bayesian P value as sigma) maps, plus
+        the map headers
+    """
+    from pymoc import MOC
+    priors, posterior = xidplus.io.load(fit_filename(tile, order) + '.pkl')
+    if seed is not None:
+        seed = [seed, int(tile)]
+    pvals = postmaps.Bayesian_pval_maps_stream(priors, posterior, nrep=nrep, chunk_size=chunk_size, seed=seed)
+    f_50 = np.percentile(posterior.samples['src_f'], 50.0, axis=0)
+
+    moc = MOC()
+    moc.add(order, [tile])
+    maps = []
+    for b, p in enumerate(priors):
+        if not hasattr(p, 'spix_hpidx'):
+            p.set_pixel_hpidx()
+        core = moc_routines.check_hpidx_in_moc(p.spix_hpidx, moc_routines.HPIDX_ORDER, moc)
+        bkg, sigma_conf = postmaps.sample_bkg_sigma_conf(posterior, b, 0, None)
+        model = postmaps.ymod_map(p, f_50[b, :]).reshape(-1) + np.median(bkg)
+        maps.append({'sx_pix': p.sx_pix[core], 'sy_pix': p.sy_pix[core], 'model': model[core],
+                     'residual': p.sim[core] - model[core], 'pval': pvals[b][core],
+                     'imphdu': p.imphdu, 'imhdu': p.imhdu})
+    return maps
+
+
+def mosaic_tiles(tilefile, bands=('SPIRE_250', 'SPIRE_350', 'SPIRE_500'), outfile_prefix='XID+', nrep=1000,
+                 chunk_size=100, seed=None, n_processes=None, memmap_dir=None, ledger=None):
+    """
+    Combine the Bayesian maps of all fitted tiles into full field model, residual and Bayesian P value maps. Tiles are
+    processed in parallel and each is written into the full field arrays as it finishes, so only a few tiles are in
+    memory at once. Each map is saved as <outfile_prefix>_<band>_<model|residual|pval>.fits
+
+    :param tilefile:  File containing Tiling scheme
+    :param bands: names of bands, one for each prior, used in filenames
+    :param outfile_prefix: prefix of output filenames
+    :param nrep: number of replicated maps used for Bayesian P value maps, at most the number of posterior samples of
+        each tile (see xidplus.posterior_maps.n_replicates)
+    :param chunk_size: number of replicated maps generated at once
+    :param seed: (default=None) seed for noise
+    :param n_processes: number of processes (default is number of cores)
+    :param memmap_dir: (default=None) directory for memory mapped full field arrays, for fields too large to hold in
+        memory. By default arrays are held in memory
+    :param ledger: (default=None) tile ledger file. If given, only tiles recorded as fitted are used, otherwise all tiles
+        with a fit file
+    :return: list of filenames of maps, list of tiles that failed
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from astropy.io import fits
+
+    with open(tilefile, 'rb') as f:
+        obj = pickle.load(f)
+    order = obj['order']
+    if ledger is not None:
+        with tile_ledger(ledger) as ledger:
+            tiles = ledger.tiles('fit', order)
+    else:
+        tiles = [tile for tile in obj['tiles'] if os.path.exists(fit_filename(tile, order) + '.pkl')]
+
+    kinds = ('model', 'residual', 'pval')
+    arrays, headers, failed = None, None, []
+    with ProcessPoolExecutor(max_workers=n_processes) as executor:
+        futures = {executor.submit(mosaic_tile, tile, order, nrep, chunk_size, seed): tile for tile in tiles}
+        for i, future in enumerate(as_completed(futures)):
+            try:
+                maps = future.result()
+            except Exception as e:
+                print("Tile {} failed: {}".format(futures[future], repr(e)))
+                failed.append(futures[future])
+                continue
+            if arrays is None:
+                headers = [(m['imphdu'], m['imhdu']) for m in maps]
+                arrays = [{kind: _full_field_array(m['imhdu'], memmap_dir, '{}_{}_{}'.format(outfile_prefix, band, kind))
+                           for kind in kinds} for band, m in zip(bands, maps)]
+            for b, m in enumerate(maps):
+                for kind in kinds:
+                    arrays[b][kind][m['sy_pix'], m['sx_pix']] = m[kind]
+            print("{}/{} tiles mosaicked".format(i + 1, len(futures)), flush=True)
+
+    outfiles = []
+    if arrays is not None:
+        for band, band_arrays, (imphdu, imhdu) in zip(bands, arrays, headers):
+            for kind in kinds:
+                outfile = '{}_{}_{}.fits'.format(outfile_prefix, band, kind)
+                fits.HDUList([fits.PrimaryHDU(header=imphdu),
+                              fits.ImageHDU(data=band_arrays[kind], header=imhdu)]).writeto(outfile, overwrite=True)
+                outfiles.append(outfile)
+    return outfiles, failed
+
+
+def _full_field_array(imhdu, memmap_dir, name):
+    """Full field map array, filled with NaN, either in memory or memory mapped to <memmap_dir>/<name>.npy"""
+    from astropy import wcs
+    nx, ny = wcs.WCS(imhdu).pixel_shape
+    if memmap_dir is None:
+        return np.full((ny, nx), np.nan)
+    array = np.lib.format.open_memmap(os.path.join(memmap_dir, name + '.npy'), mode='w+', dtype=np.float64,
+                                      shape=(ny, nx))
+    array[:] = np.nan
+    return array
+
+
+def cat_filename(tile, order):
+    """Filename of catalogue for a fitted tile
+
+    :param tile: HEALPix pixel of tile
+    :param order: order of tile
+    :return: filename
+    """
+    return 'Cat_' + str(tile) + '_' + str(order) + '.fits'
+
+
+def tile_catalogue(tile, order, bands=('SPIRE_250', 'SPIRE_350', 'SPIRE_500')):
+    """
+    Create and save catalogue (see xidplus.catalogue.create_cat) for a fitted tile. The catalogue contains all sources
+    in the fitting region of the tile
+
+    :param tile: HEALPix pixel of small tile
+    :param order: order of small tile
+    :param bands: names of bands, one for each prior
+    :return: filename of catalogue
+    """
+    from xidplus import catalogue
+    priors, posterior = xidplus.io.load(fit_filename(tile, order) + '.pkl')
+    outfile = cat_filename(tile, order)
+    catalogue.create_cat(posterior, priors, list(bands)).writeto(outfile, overwrite=True)
+    return outfile
+
+
+def _merge_worker(tile, order, bands):
+    """Sources in a tile catalogue that are in the tile itself (rather than its padded fitting region)
+
+    :return: table rows, table headers
+    """
+    from astropy.io import fits
+    if not os.path.exists(cat_filename(tile, order)):
+        tile_catalogue(tile, order, bands)
+    with fits.open(cat_filename(tile, order)) as hdulist:
+        data = hdulist[1].data
+        owned = moc_routines.sources_in_tile([tile], order, data['RA'], data['Dec'])
+        return np.asarray(data[owned]).copy(), (hdulist[0].header, hdulist[1].header)
+
+
+def merge_catalogues(tilefile, outfile, bands=('SPIRE_250', 'SPIRE_350', 'SPIRE_500'), n_processes=None, ledger=None):
+    """
+    Merge the catalogues of all fitted tiles into one catalogue. As the fitting regions of tiles overlap, sources near
+    tile edges are fitted in several tiles; each source is taken only from the tile it is in. Tile catalogues
+    (Cat_<tile>_<order>.fits) are read in parallel and created from the fits if they do not exist. The rows of each
+    tile are appended to a temporary file (<outfile>.rows) as it is read, so only a few tiles are in memory at once.
+
+    :param tilefile:  File containing Tiling scheme
+    :param outfile: filename of merged catalogue
+    :param bands: names of bands, one for each prior, used if tile catalogues need to be created
+    :param n_processes: number of processes (default is number of cores)
+    :param ledger: (default=None) tile ledger file. If given, only tiles recorded as fitted are used, otherwise all tiles
+        with a fit file or catalogue
+    :return: list of tiles that failed
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from astropy.io import fits
+
+    with open(tilefile, 'rb') as f:
+        obj = pickle.load(f)
+    order = obj['order']
+    if ledger is not None:
+        with tile_ledger(ledger) as ledger:
+            tiles = ledger.tiles('fit', order)
+    else:
+        tiles = [tile for tile in obj['tiles'] if os.path.exists(cat_filename(tile, order))
+                 or os.path.exists(fit_filename(tile, order) + '.pkl')]
+
+    rows_file = outfile + '.rows'
+    headers, dtype, nrows, failed = None, None, 0, []
+    with ProcessPoolExecutor(max_workers=n_processes) as executor, open(rows_file, 'wb') as f:
+        # results are collected in tile order, so the merged catalogue does not depend on which tiles finish first
+        futures = [executor.submit(_merge_worker, tile, order, bands) for tile in tiles]
+        for i, (tile, future) in enumerate(zip(tiles, futures)):
+            try:
+                data, tile_headers = future.result()
+            except Exception as e:
+                print("Tile {} failed: {}".format(tile, repr(e)))
+                failed.append(tile)
+                continue
+            if headers is None:
+                headers, dtype = tile_headers, data.dtype
+            f.write(data.astype(dtype, copy=False).tobytes())
+            nrows += len(data)
+            print("{}/{} tiles merged".format(i + 1, len(futures)), flush=True)
+
+    if headers is not None:
+        rows = np.memmap(rows_file, dtype=dtype, mode='r', shape=(nrows,)) if nrows > 0 else np.empty(0, dtype=dtype)
+        fits.HDUList([fits.PrimaryHDU(header=headers[0]),
+                      fits.BinTableHDU(data=rows, header=headers[1])]).writeto(outfile, overwrite=True)
+        del rows
+    os.remove(rows_file)
+    return failed
+
+
+def _open_ledger(ledger, stage, order, tiles):
+    """Open ledger file (if given) and make sure it contains all tiles
+
+    :return: tile_ledger class, or a context manager giving None if no ledger file is given
+    """
+    from contextlib import nullcontext
+    if ledger is None:
+        return nullcontext()
+    ledger = tile_ledger(ledger)
+    ledger.add(stage, order, tiles)
+    return ledger
+
+
+def _wait(futures, label, ledger=None, stage=None, order=None):
+    """Wait for tile futures to finish, reporting progress and recording outcome in ledger
+
+    :param futures: dictionary of future: tile
+    :param label: description of what is being done, for progress
+    :param ledger: (default=None) tile_ledger class
+    :param stage: stage of run, for ledger
+    :param order: order of tiles, for ledger
+    :return: list of tiles that failed
+    """
+    from concurrent.futures import as_completed
+    failed = []
+    for i, future in enumerate(as_completed(futures)):
+        tile = futures[future]
+        try:
+            out = future.result()
+        except Exception as e:
+            out = {'result': None, 'wall_time': None, 'error': repr(e)}
+        if out['error'] is not None:
+            print("Tile {} failed: {}".format(tile, out['error']))
+            failed.append(tile)
+            if ledger is not None:
+                ledger.set_state(stage, order, tile, 'failed', wall_time=out['wall_time'], error=out['error'])
+        elif ledger is not None:
+            ledger.set_state(stage, order, tile, 'done', wall_time=out['wall_time'], **out['result'][1])
+        print("{}/{} {}".format(i + 1, len(futures), label), flush=True)
+    return failed
@@ -6,118 +6,89 @@ import xidplus.posterior_maps as postmaps
 
 
 
-def create_PACS_cat(posterior, prior100, prior160):
+def create_cat(posterior, priors, bands, title='XID+ catalogue', flux_unit='mJy', bkg_unit='mJy/Beam',
+               id_name='HELP_ID', src_params=(), nrep=1000, chunk_size=100, seed=None):
 
     """
-    Create PACS catalogue from posterior
-    
-    :param posterior: PACS xidplus.posterior class
-    :param prior100:  PACS 100 xidplus.prior class
-    :param prior160:  PACS 160 xidplus.prior class
+    Create catalogue from posterior, for any combination of bands (e.g. single instrument or SED fits)
+
+    Columns are named after the bands, e.g. band 'SPIRE_250' gives F_SPIRE_250, FErr_SPIRE_250_u, FErr_SPIRE_250_l,
+    Bkg_SPIRE_250, Sig_conf_SPIRE_250, Rhat_SPIRE_250, n_eff_SPIRE_250 and Pval_res_250. The MCMC convergence columns
+    are only included if the posterior has them.
+
+    :param posterior: xidplus.posterior class
+    :param priors: list of xidplus.prior classes used in fit
+    :param bands: list of band names, one for each prior. The last part of the name (after '_') is used as wavelength
+    :param title: title for primary header
+    :param flux_unit: unit of flux, either one for all bands or a list with one for each band
+    :param bkg_unit: unit of background and confusion noise, either one for all bands or a list with one for each band
+    :param id_name: name of ID column
+    :param src_params: names of other per source parameters in posterior samples (e.g. 'Nbb', 'z' for SED fits) to add
+    :param nrep: (default=1000) number of replicated maps for the Bayes Pval residual statistic, at most the number of
+        posterior samples (see xidplus.posterior_maps.n_replicates)
+    :param chunk_size: (default=100) number of replicated maps generated at once
+    :param seed: (default=None) seed for replicated map noise
     :return: fits hdulist
     """
     import datetime
-    nsrc=prior100.nsrc
-    rep_maps=postmaps.replicated_maps([prior100,prior160],posterior)
-    Bayes_P100=postmaps.Bayes_Pval_res(prior100,rep_maps[0])
-    Bayes_P160=postmaps.Bayes_Pval_res(prior160,rep_maps[1])
-
+    if len(bands) != len(priors):
+        raise ValueError('Number of bands ({}) does not match number of priors ({})'.format(len(bands), len(priors)))
+    nsrc=priors[0].nsrc
+    wavelengths=[band.split('_')[-1] for band in bands]
+    if isinstance(flux_unit, str):
+        flux_unit=[flux_unit]*len(bands)
+    if isinstance(bkg_unit, str):
+        bkg_unit=[bkg_unit]*len(bands)
+
+    Bayes_P=postmaps.Bayes_Pval_res_stream(priors, posterior, nrep=nrep, chunk_size=chunk_size, seed=seed)
+    # percentiles of posterior, calculated once for all bands
+    f_50,f_84,f_16=np.percentile(posterior.samples['src_f'],[50.0,84.1,15.9],axis=0)
+    bkg_50=np.percentile(posterior.samples['bkg'],50.0,axis=0)
+    sig_conf_50=np.percentile(posterior.samples['sigma_conf'],50.0,axis=0)
+    Rhat=getattr(posterior, 'Rhat', None)
+    n_eff=getattr(posterior, 'n_eff', None)
 
     # ----table info-----------------------
-    # first define columns
-    c1 = fits.Column(name='help_id', format='27A', array=prior100.ID)
-    c2 = fits.Column(name='RA', format='D', unit='degrees', array=prior100.sra)
-    c3 = fits.Column(name='Dec', format='D', unit='degrees', array=prior100.sdec)
-    c4 = fits.Column(name='F_PACS_100', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,0,:],50.0,axis=0))
-    c5 = fits.Column(name='FErr_PACS_100_u', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,0,:],84.1,axis=0))
-    c6 = fits.Column(name='FErr_PACS_100_l', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,0,:],15.9,axis=0))
-    c7 = fits.Column(name='F_PACS_160', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,1,:],50.0,axis=0))
-    c8 = fits.Column(name='FErr_PACS_160_u', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,1,:],84.1,axis=0))
-    c9 = fits.Column(name='FErr_PACS_160_l', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,1,:],15.9,axis=0))
-    c10 = fits.Column(name='Bkg_PACS_100', format='E', unit='mJy/Beam',
-                      array=np.full(nsrc,np.percentile(posterior.samples['bkg'][:,0],50.0,axis=0)))
-    c11 = fits.Column(name='Bkg_PACS_160', format='E', unit='mJy/Beam',
-                      array=np.full(nsrc,np.percentile(posterior.samples['bkg'][:,1],50.0,axis=0)))
-    c12 = fits.Column(name='Sig_conf_PACS_100', format='E', unit='mJy/Beam',
-                      array=np.full(nsrc,np.percentile(posterior.samples['sigma_conf'][:,0],50.0,axis=0)))
-    c13 = fits.Column(name='Sig_conf_PACS_160', format='E', unit='mJy/Beam',
-                      array=np.full(nsrc, np.percentile(posterior.samples['sigma_conf'][:,1],50.0,axis=0)))
-    c14 = fits.Column(name='Rhat_PACS_100', format='E', array=posterior.Rhat['src_f'][:,0])
-    c15 = fits.Column(name='Rhat_PACS_160', format='E', array=posterior.Rhat['src_f'][:,1])
-    c16 = fits.Column(name='n_eff_PACS_100', format='E', array=posterior.n_eff['src_f'][:,0])
-    c17 = fits.Column(name='n_eff_PACS_160', format='E', array=posterior.n_eff['src_f'][:,1])
-    c18 = fits.Column(name='Pval_res_100', format='E', array=Bayes_P100)
-    c19 = fits.Column(name='Pval_res_160', format='E', array=Bayes_P160)
-
-
-    tbhdu = fits.BinTableHDU.from_columns([c1, c2, c3, c4, c5, c6, c7, c8, c9, c10, c11, c12, c13, c14, c15, c16, c17, c18, c19])
-
-    tbhdu.header.set('TUCD1', 'ID', after='TFORM1')
-    tbhdu.header.set('TDESC1', 'ID of source', after='TUCD1')
-
-    tbhdu.header.set('TUCD2', 'pos.eq.RA', after='TUNIT2')
-    tbhdu.header.set('TDESC2', 'R.A. of object J2000', after='TUCD2')
-
-    tbhdu.header.set('TUCD3', 'pos.eq.DEC', after='TUNIT3')
-    tbhdu.header.set('TDESC3', 'Dec. of object J2000', after='TUCD3')
-
-    tbhdu.header.set('TUCD4', 'phot.flux.density', after='TUNIT4')
-    tbhdu.header.set('TDESC4', '100 Flux (at 50th percentile)', after='TUCD4')
-
-    tbhdu.header.set('TUCD5', 'phot.flux.density', after='TUNIT5')
-    tbhdu.header.set('TDESC5', '100 Flux (at 84.1 percentile) ', after='TUCD5')
-
-    tbhdu.header.set('TUCD6', 'phot.flux.density', after='TUNIT6')
-    tbhdu.header.set('TDESC6', '100 Flux (at 15.9 percentile)', after='TUCD6')
-
-    tbhdu.header.set('TUCD7', 'phot.flux.density', after='TUNIT7')
-    tbhdu.header.set('TDESC7', '160 Flux (at 50th percentile)', after='TUCD7')
-
-    tbhdu.header.set('TUCD8', 'phot.flux.density', after='TUNIT8')
-    tbhdu.header.set('TDESC8', '160 Flux (at 84.1 percentile) ', after='TUCD8')
-
-    tbhdu.header.set('TUCD9', 'phot.flux.density', after='TUNIT9')
-    tbhdu.header.set('TDESC9', '160 Flux (at 15.9 percentile)', after='TUCD9')
-
-    tbhdu.header.set('TUCD10', 'phot.flux.density', after='TUNIT10')
-    tbhdu.header.set('TDESC10', '100 background', after='TUCD10')
-
-    tbhdu.header.set('TUCD11', 'phot.flux.density', after='TUNIT11')
-    tbhdu.header.set('TDESC11', '160 background', after='TUCD11')
-
-    tbhdu.header.set('TUCD12', 'phot.flux.density', after='TUNIT12')
-    tbhdu.header.set('TDESC12', '100 residual confusion noise', after='TUCD12')
-
-    tbhdu.header.set('TUCD13', 'phot.flux.density', after='TUNIT13')
-    tbhdu.header.set('TDESC13', '160 residual confusion noise', after='TUCD13')
-
-    tbhdu.header.set('TUCD14', 'stat.value', after='TFORM14')
-    tbhdu.header.set('TDESC14', '100 MCMC Convergence statistic', after='TUCD14')
-
-    tbhdu.header.set('TUCD15', 'stat.value', after='TFORM15')
-    tbhdu.header.set('TDESC15', '160 MCMC Convergence statistic', after='TUCD15')
-
-    tbhdu.header.set('TUCD16', 'stat.value', after='TFORM16')
-    tbhdu.header.set('TDESC16', '100 MCMC independence statistic', after='TUCD16')
+    # columns as (name, format, unit, array, UCD, description)
+    columns=[(id_name, '27A', None, priors[0].ID, 'ID', 'ID of source'),
+             ('RA', 'D', 'degrees', priors[0].sra, 'pos.eq.RA', 'R.A. of object J2000'),
+             ('Dec', 'D', 'degrees', priors[0].sdec, 'pos.eq.DEC', 'Dec. of object J2000')]
+    for b,(band,w) in enumerate(zip(bands,wavelengths)):
+        columns+=[('F_'+band, 'E', flux_unit[b], f_50[b,:], 'phot.flux.density', w+' Flux (at 50th percentile)'),
+                  ('FErr_'+band+'_u', 'E', flux_unit[b], f_84[b,:], 'phot.flux.density', w+' Flux (at 84.1 percentile)'),
+                  ('FErr_'+band+'_l', 'E', flux_unit[b], f_16[b,:], 'phot.flux.density', w+' Flux (at 15.9 percentile)')]
+    for b,(band,w) in enumerate(zip(bands,wavelengths)):
+        columns.append(('Bkg_'+band, 'E', bkg_unit[b], np.full(nsrc,bkg_50[b]), 'phot.flux.density', w+' background'))
+    for b,(band,w) in enumerate(zip(bands,wavelengths)):
+        columns.append(('Sig_conf_'+band, 'E', bkg_unit[b], np.full(nsrc,sig_conf_50[b]), 'phot.flux.density',
+                        w+' residual confusion noise'))
+    if Rhat is not None:
+        for b,(band,w) in enumerate(zip(bands,wavelengths)):
+            columns.append(('Rhat_'+band, 'E', None, Rhat['src_f'][:,b], 'stat.value', w+' MCMC Convergence statistic'))
+    if n_eff is not None:
+        for b,(band,w) in enumerate(zip(bands,wavelengths)):
+            columns.append(('n_eff_'+band, 'E', None, n_eff['src_f'][:,b], 'stat.value', w+' MCMC independence statistic'))
+    for b,w in enumerate(wavelengths):
+        columns.append(('Pval_res_'+w, 'E', None, Bayes_P[b], 'stat.value', w+' Bayes Pval residual statistic'))
+    for param in src_params:
+        p_50,p_84,p_16=np.percentile(posterior.samples[param],[50.0,84.1,15.9],axis=0)
+        columns+=[(param, 'E', None, p_50, 'stat.value', param+' (at 50th percentile)'),
+                  (param+'_u', 'E', None, p_84, 'stat.value', param+' (at 84.1 percentile)'),
+                  (param+'_l', 'E', None, p_16, 'stat.value', param+' (at 15.9 percentile)')]
+        if Rhat is not None and param in Rhat:
+            columns.append(('Rhat_'+param, 'E', None, Rhat[param], 'stat.value', param+' MCMC Convergence statistic'))
+
+    tbhdu = fits.BinTableHDU.from_columns([fits.Column(name=name, format=format, unit=unit, array=array)
+                                           for name, format, unit, array, ucd, desc in columns])
+    for i, (name, format, unit, array, ucd, desc) in enumerate(columns, start=1):
+        after = 'TUNIT{}'.format(i) if unit is not None else 'TFORM{}'.format(i)
+        tbhdu.header.set('TUCD{}'.format(i), ucd, after=after)
+        tbhdu.header.set('TDESC{}'.format(i), desc, after='TUCD{}'.format(i))
 
-    tbhdu.header.set('TUCD17', 'stat.value', after='TFORM17')
-    tbhdu.header.set('TDESC17', '160 MCMC independence statistic', after='TUCD17')
-    
-    tbhdu.header.set('TUCD18','stat.value',after='TFORM18')
-    tbhdu.header.set('TDESC18','100 Bayes Pval residual statistic',after='TUCD18')
-
-    tbhdu.header.set('TUCD19','stat.value',after='TFORM19')
-    tbhdu.header.set('TDESC19','160 Bayes Pval residual statistic',after='TUCD19')
     # ----Primary header-----------------------------------
     prihdr = fits.Header()
-    prihdr['Prior_Cat'] = prior100.prior_cat
-    prihdr['TITLE'] = 'PACS XID+ catalogue'
+    prihdr['Prior_Cat'] = priors[0].prior_cat
+    prihdr['TITLE'] = title
     # prihdr['OBJECT']  = prior250.imphdu['OBJECT'] #I need to think if this needs to change
     prihdr['CREATOR'] = 'WP5'
     prihdr['XIDplus'] = io.git_version()
@@ -126,87 +97,34 @@ def create_PACS_cat(posterior, prior100, prior160):
     thdulist = fits.HDUList([prihdu, tbhdu])
     return thdulist
 
-# noinspection PyPackageRequirements
 
-def create_MIPS_cat(posterior, prior24, Bayes_P24):
+def create_PACS_cat(posterior, prior100, prior160):
 
     """
-    Create MIPS catalogue from posterior
-    
-    :param posterior: MIPS xidplus.posterior class
-    :param prior24: MIPS xidplus.prior class
-    :param Bayes_P24:  Bayes Pvalue residual statistic for MIPS 24
+    Create PACS catalogue from posterior
+
+    :param posterior: PACS xidplus.posterior class
+    :param prior100:  PACS 100 xidplus.prior class
+    :param prior160:  PACS 160 xidplus.prior class
     :return: fits hdulist
     """
-    import datetime
-    nsrc=prior24.nsrc
-    rep_maps = postmaps.replicated_maps([prior24], posterior)
-    Bayes_P24 = postmaps.Bayes_Pval_res(prior24, rep_maps[0])
-    # ----table info-----------------------
-    # first define columns
-    c1 = fits.Column(name='help_id', format='27A', array=prior24.ID)
-    c2 = fits.Column(name='RA', format='D', unit='degrees', array=prior24.sra)
-    c3 = fits.Column(name='Dec', format='D', unit='degrees', array=prior24.sdec)
-    c4 = fits.Column(name='F_MIPS_24', format='E', unit='muJy',
-                     array=np.percentile(posterior.samples['src_f'][:,0,:],50.0,axis=0))
-    c5 = fits.Column(name='FErr_MIPS_24_u', format='E', unit='muJy',
-                     array=np.percentile(posterior.samples['src_f'][:,0,:],84.1,axis=0))
-    c6 = fits.Column(name='FErr_MIPS_24_l', format='E', unit='muJy',
-                     array=np.percentile(posterior.samples['src_f'][:,0,:],15.9,axis=0))
-    c7 = fits.Column(name='Bkg_MIPS_24', format='E', unit='MJy/sr',
-                     array=np.full(nsrc,np.percentile(posterior.samples['bkg'][:,0],50.0,axis=0)))
-    c8 = fits.Column(name='Sig_conf_MIPS_24', format='E', unit='MJy/sr',
-                     array=np.full(nsrc, np.percentile(posterior.samples['sigma_conf'][:,0],50.0,axis=0)))
-    c9 = fits.Column(name='Rhat_MIPS_24', format='E', array=posterior.Rhat['src_f'][:,0])
-    c10 = fits.Column(name='n_eff_MIPS_24', format='E', array=posterior.n_eff['src_f'][:,0])
-    c11 = fits.Column(name='Pval_res_24', format='E', array=Bayes_P24)
-    
-    tbhdu = fits.BinTableHDU.from_columns([c1, c2, c3, c4, c5, c6, c7, c8, c9, c10, c11])
-
-    tbhdu.header.set('TUCD1', 'ID', after='TFORM1')
-    tbhdu.header.set('TDESC1', 'ID of source', after='TUCD1')
-
-    tbhdu.header.set('TUCD2', 'pos.eq.RA', after='TUNIT2')
-    tbhdu.header.set('TDESC2', 'R.A. of object J2000', after='TUCD2')
-
-    tbhdu.header.set('TUCD3', 'pos.eq.DEC', after='TUNIT3')
-    tbhdu.header.set('TDESC3', 'Dec. of object J2000', after='TUCD3')
-
-    tbhdu.header.set('TUCD4', 'phot.flux.density', after='TUNIT4')
-    tbhdu.header.set('TDESC4', '24 Flux (at 50th percentile)', after='TUCD4')
-
-    tbhdu.header.set('TUCD5','phot.flux.density',after='TUNIT5')
-    tbhdu.header.set('TDESC5','24 Flux (at 84.1 percentile) ',after='TUCD5')
+    return create_cat(posterior, [prior100, prior160], ['PACS_100', 'PACS_160'], title='PACS XID+ catalogue',
+                      id_name='help_id')
 
-    tbhdu.header.set('TUCD6','phot.flux.density',after='TUNIT6')
-    tbhdu.header.set('TDESC6','24 Flux (at 15.9 percentile)',after='TUCD6')
-
-    tbhdu.header.set('TUCD7','phot.flux.density',after='TUNIT7')
-    tbhdu.header.set('TDESC7','24 background',after='TUCD7')
-
-    tbhdu.header.set('TUCD8','phot.flux.density',after='TUNIT8')
-    tbhdu.header.set('TDESC8','24 residual confusion noise',after='TUCD8')
-
-    tbhdu.header.set('TUCD9','stat.value',after='TFORM9')
-    tbhdu.header.set('TDESC9','24 MCMC Convergence statistic',after='TUCD9')
+# noinspection PyPackageRequirements
 
-    tbhdu.header.set('TUCD10','stat.value',after='TFORM10')
-    tbhdu.header.set('TDESC10','24 MCMC independence statistic',after='TUCD10')
+def create_MIPS_cat(posterior, prior24, Bayes_P24=None):
 
-    tbhdu.header.set('TUCD11','stat.value',after='TFORM11')
-    tbhdu.header.set('TDESC11','24 Bayes Pval residual statistic',after='TUCD11')
+    """
+    Create MIPS catalogue from posterior
 
-    #----Primary header-----------------------------------
-    prihdr = fits.Header()
-    prihdr['Prior_Cat'] = prior24.prior_cat
-    prihdr['TITLE']   = 'XID+MIPS catalogue'
-    #prihdr['OBJECT']  = prior250.imphdu['OBJECT'] #I need to think if this needs to change
-    prihdr['CREATOR'] = 'WP5'
-    prihdr['XIDplus'] = io.git_version()
-    prihdr['DATE']    = datetime.datetime.now().isoformat()
-    prihdu = fits.PrimaryHDU(header=prihdr)
-    thdulist = fits.HDUList([prihdu, tbhdu])
-    return thdulist
+    :param posterior: MIPS xidplus.posterior class
+    :param prior24: MIPS xidplus.prior class
+    :param Bayes_P24:  not used, Bayes Pvalue residual statistic for MIPS 24 is calculated from posterior
+    :return: fits hdulist
+    """
+    return create_cat(posterior, [prior24], ['MIPS_24'], title='XID+MIPS catalogue', flux_unit='muJy',
+                      bkg_unit='MJy/sr', id_name='help_id')
 # noinspection PyPackageRequirements
 
 
@@ -220,160 +138,7 @@ def create_SPIRE_cat(posterior,prior250,prior350,prior500):
     :param prior250: SPIRE 250 xidplus.prior class
     :param prior350: SPIRE 350 xidplus.prior class
     :param prior500: SPIRE 500 xidplus.prior class
-    :param Bayes_P250: Bayes Pvalue residual statistic for SPIRE 250
-    :param Bayes_P350: Bayes Pvalue residual statistic for SPIRE 350
-    :param Bayes_P500: Bayes Pvalue residual statistic for SPIRE 500
     :return: fits hdulist
     """
-    import datetime
-    nsrc=posterior.nsrc
-    rep_maps = postmaps.replicated_maps([prior250, prior350,prior500], posterior)
-    Bayes_P250 = postmaps.Bayes_Pval_res(prior250, rep_maps[0])
-    Bayes_P350 = postmaps.Bayes_Pval_res(prior350, rep_maps[1])
-    Bayes_P500 = postmaps.Bayes_Pval_res(prior500, rep_maps[2])
-
-
-    #----table info-----------------------
-    #first define columns
-    c1 = fits.Column(name='HELP_ID', format='27A', array=prior250.ID)
-    c2 = fits.Column(name='RA', format='D', unit='degrees', array=prior250.sra)
-    c3 = fits.Column(name='Dec', format='D', unit='degrees', array=prior250.sdec)
-    c4 = fits.Column(name='F_SPIRE_250', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,0,:],50.0,axis=0))
-    c5 = fits.Column(name='FErr_SPIRE_250_u', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,0,:],84.1,axis=0))
-    c6 = fits.Column(name='FErr_SPIRE_250_l', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,0,:],15.9,axis=0))
-    c7 = fits.Column(name='F_SPIRE_350', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,1,:],50.0,axis=0))
-    c8 = fits.Column(name='FErr_SPIRE_350_u', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,1,:],84.1,axis=0))
-    c9 = fits.Column(name='FErr_SPIRE_350_l', format='E', unit='mJy',
-                     array=np.percentile(posterior.samples['src_f'][:,1,:],15.9,axis=0))
-    c10 = fits.Column(name='F_SPIRE_500', format='E', unit='mJy',
-                      array=np.percentile(posterior.samples['src_f'][:,2,:],50.0,axis=0))
-    c11 = fits.Column(name='FErr_SPIRE_500_u', format='E', unit='mJy',
-                      array=np.percentile(posterior.samples['src_f'][:,2,:],84.1,axis=0))
-    c12 = fits.Column(name='FErr_SPIRE_500_l', format='E', unit='mJy',
-                      array=np.percentile(posterior.samples['src_f'][:,2,:],15.9,axis=0))
-    c13 = fits.Column(name='Bkg_SPIRE_250', format='E', unit='mJy/Beam',
-                      array=np.full(nsrc,np.percentile(posterior.samples['bkg'][:,0],50.0,axis=0)))
-    c14 = fits.Column(name='Bkg_SPIRE_350', format='E', unit='mJy/Beam',
-                      array=np.full(nsrc,np.percentile(posterior.samples['bkg'][:,1],50.0,axis=0)))
-    c15 = fits.Column(name='Bkg_SPIRE_500', format='E', unit='mJy/Beam',
-                      array=np.full(nsrc,np.percentile(posterior.samples['bkg'][:,2],50.0,axis=0)))
-    c16 = fits.Column(name='Sig_conf_SPIRE_250', format='E',unit='mJy/Beam',
-                      array=np.full(nsrc,np.percentile(posterior.samples['sigma_conf'][:,0],50.0,axis=0)))
-    c17 = fits.Column(name='Sig_conf_SPIRE_350', format='E',unit='mJy/Beam',
-                      array=np.full(nsrc,np.percentile(posterior.samples['sigma_conf'][:,1],50.0,axis=0)))
-    c18 = fits.Column(name='Sig_conf_SPIRE_500', format='E',unit='mJy/Beam',
-                      array=np.full(nsrc,np.percentile(posterior.samples['sigma_conf'][:,2],50.0,axis=0)))
-    c19 = fits.Column(name='Rhat_SPIRE_250', format='E', array=posterior.Rhat['src_f'][:,0])
-    c20 = fits.Column(name='Rhat_SPIRE_350', format='E', array=posterior.Rhat['src_f'][:,1])
-    c21 = fits.Column(name='Rhat_SPIRE_500', format='E', array=posterior.Rhat['src_f'][:,2])
-    c22 = fits.Column(name='n_eff_SPIRE_250', format='E', array=posterior.n_eff['src_f'][:,0])
-    c23 = fits.Column(name='n_eff_SPIRE_350', format='E', array=posterior.n_eff['src_f'][:,1])
-    c24 = fits.Column(name='n_eff_SPIRE_500', format='E', array=posterior.n_eff['src_f'][:,2])
-    c25 = fits.Column(name='Pval_res_250', format='E', array=Bayes_P250)
-    c26 = fits.Column(name='Pval_res_350', format='E', array=Bayes_P350)
-    c27 = fits.Column(name='Pval_res_500', format='E', array=Bayes_P500)
-    
-
-    tbhdu = fits.BinTableHDU.from_columns([c1, c2, c3, c4, c5, c6, c7, c8, c9, c10, c11,
-                            c12, c13, c14, c15, c16, c17, c18, c19, c20, c21, c22,
-                            c24, c23, c25, c26, c27])
-
-    tbhdu.header.set('TUCD1','ID',after='TFORM1')
-    tbhdu.header.set('TDESC1','ID of source',after='TUCD1')
-
-    tbhdu.header.set('TUCD2','pos.eq.RA',after='TUNIT2')      
-    tbhdu.header.set('TDESC2','R.A. of object J2000',after='TUCD2') 
-
-    tbhdu.header.set('TUCD3','pos.eq.DEC',after='TUNIT3')      
-    tbhdu.header.set('TDESC3','Dec. of object J2000',after='TUCD3') 
-
-    tbhdu.header.set('TUCD4','phot.flux.density',after='TUNIT4')      
-    tbhdu.header.set('TDESC4','250 Flux (at 50th percentile)',after='TUCD4') 
-
-    tbhdu.header.set('TUCD5','phot.flux.density',after='TUNIT5')      
-    tbhdu.header.set('TDESC5','250 Flux (at 84.1 percentile) ',after='TUCD5') 
-
-    tbhdu.header.set('TUCD6','phot.flux.density',after='TUNIT6')      
-    tbhdu.header.set('TDESC6','250 Flux (at 15.9 percentile)',after='TUCD6') 
-
-    tbhdu.header.set('TUCD7','phot.flux.density',after='TUNIT7')      
-    tbhdu.header.set('TDESC7','350 Flux (at 50th percentile)',after='TUCD7') 
-
-    tbhdu.header.set('TUCD8','phot.flux.density',after='TUNIT8')      
-    tbhdu.header.set('TDESC8','350 Flux (at 84.1 percentile) ',after='TUCD8') 
-
-    tbhdu.header.set('TUCD9','phot.flux.density',after='TUNIT9')      
-    tbhdu.header.set('TDESC9','350 Flux (at 15.9 percentile)',after='TUCD9') 
-
-    tbhdu.header.set('TUCD10','phot.flux.density',after='TUNIT10')      
-    tbhdu.header.set('TDESC10','500 Flux (at 50th percentile)',after='TUCD10') 
-
-    tbhdu.header.set('TUCD11','phot.flux.density',after='TUNIT11')      
-    tbhdu.header.set('TDESC11','500 Flux (at 84.1 percentile) ',after='TUCD11') 
-
-    tbhdu.header.set('TUCD12','phot.flux.density',after='TUNIT12')      
-    tbhdu.header.set('TDESC12','500 Flux (at 15.9 percentile)',after='TUCD12')
-
-    tbhdu.header.set('TUCD13','phot.flux.density',after='TUNIT13')      
-    tbhdu.header.set('TDESC13','250 background',after='TUCD13') 
-
-    tbhdu.header.set('TUCD14','phot.flux.density',after='TUNIT14')      
-    tbhdu.header.set('TDESC14','350 background',after='TUCD14') 
-
-    tbhdu.header.set('TUCD15','phot.flux.density',after='TUNIT15')      
-    tbhdu.header.set('TDESC15','500 background',after='TUCD15')
-
-    tbhdu.header.set('TUCD16','phot.flux.density',after='TUNIT16')
-    tbhdu.header.set('TDESC16','250 residual confusion noise',after='TUCD16')
-
-    tbhdu.header.set('TUCD17','phot.flux.density',after='TUNIT17')
-    tbhdu.header.set('TDESC17','350 residual confusion noise',after='TUCD17')
-
-    tbhdu.header.set('TUCD18','phot.flux.density',after='TUNIT18')
-    tbhdu.header.set('TDESC18','500 residual confusion noise',after='TUCD18')
-
-    tbhdu.header.set('TUCD19','stat.value',after='TFORM16')
-    tbhdu.header.set('TDESC19','250 MCMC Convergence statistic',after='TUCD19')
-
-    tbhdu.header.set('TUCD20','stat.value',after='TFORM20')
-    tbhdu.header.set('TDESC20','350 MCMC Convergence statistic',after='TUCD20')
-
-    tbhdu.header.set('TUCD21','stat.value',after='TFORM21')
-    tbhdu.header.set('TDESC21','500 MCMC Convergence statistic',after='TUCD21')
-
-    tbhdu.header.set('TUCD22','stat.value',after='TFORM22')
-    tbhdu.header.set('TDESC22','250 MCMC independence statistic',after='TUCD22')
-
-    tbhdu.header.set('TUCD23','stat.value',after='TFORM23')
-    tbhdu.header.set('TDESC23','350 MCMC independence statistic',after='TUCD23')
-
-    tbhdu.header.set('TUCD24','stat.value',after='TFORM24')
-    tbhdu.header.set('TDESC24','500 MCMC independence statistic',after='TUCD24')
-
-    tbhdu.header.set('TUCD25','stat.value',after='TFORM25')
-    tbhdu.header.set('TDESC25','250 Bayes Pval residual statistic',after='TUCD25')
-
-    tbhdu.header.set('TUCD26','stat.value',after='TFORM26')
-    tbhdu.header.set('TDESC26','350 Bayes Pval residual statistic',after='TUCD26')
-
-    tbhdu.header.set('TUCD27','stat.value',after='TFORM27')
-    tbhdu.header.set('TDESC27','500 Bayes Pval residual statistic',after='TUCD27')
-
-    #----Primary header-----------------------------------
-    prihdr = fits.Header()
-    prihdr['Prior_Cat'] = prior250.prior_cat
-    prihdr['TITLE']   = 'SPIRE XID+ catalogue'
-    #prihdr['OBJECT']  = prior250.imphdu['OBJECT'] #I need to think if this needs to change                              
-    prihdr['CREATOR'] = 'WP5'                                 
-    prihdr['XIDplus'] = io.git_version()
-    prihdr['DATE']    = datetime.datetime.now().isoformat()              
-    prihdu = fits.PrimaryHDU(header=prihdr)
-    
-    thdulist = fits.HDUList([prihdu, tbhdu])
-    return thdulist
-
+    return create_cat(posterior, [prior250, prior350, prior500], ['SPIRE_250', 'SPIRE_350', 'SPIRE_500'],
+                      title='SPIRE XID+ catalogue')
@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 
 import subprocess
+import os
+import json
+import importlib
+from functools import lru_cache
 from os.path import dirname
 
 import pickle
+import numpy as np
 
 
+@lru_cache(maxsize=None)
 def git_version():
     """Returns the git version of the module
     This function returns a string composed of the abbreviated Git hash of the
@@ -14,29 +20,32 @@ def git_version():
     string.
     This is used to print the exact version of the source code that was used
     inside a Jupiter notebook.
+    The version is found once per process. It can be set (e.g. when building a
+    container without git) with the XIDPLUS_VERSION environment variable, and
+    falls back to the installed package version when git is not available.
     """
+    if 'XIDPLUS_VERSION' in os.environ:
+        return os.environ['XIDPLUS_VERSION']
     module_dir = dirname(__file__)
 
-    command_hash = "cd {} && git rev-list --max-count=1 " \
-        "--abbrev-commit HEAD".format(module_dir)
-    command_date = "cd {} && git log -1 --format=%cd" \
-        .format(module_dir)
-    command_modif = "cd {} && git diff-index --name-only HEAD" \
-        .format(module_dir)
+    def git(*args):
+        return subprocess.check_output(('git',) + args, cwd=module_dir, stderr=subprocess.DEVNULL)\
+            .decode('ascii').strip()
 
     try:
-        commit_hash = subprocess.check_output(command_hash, shell=True)\
-            .decode('ascii').strip()
-        commit_date = subprocess.check_output(command_date, shell=True)\
-            .decode('ascii').strip()
-        commit_modif = subprocess.check_output(command_modif, shell=True)\
-            .decode('ascii').strip()
+        commit_hash = git('rev-list', '--max-count=1', '--abbrev-commit', 'HEAD')
+        commit_date = git('log', '-1', '--format=%cd')
+        commit_modif = git('diff-index', '--name-only', 'HEAD')
 
         version = "{} ({})".format(commit_hash, commit_date)
         if commit_modif:
             version += " [with local modifications]"
-    except subprocess.CalledProcessError:
-        version = "Unable to determine version."
+    except (subprocess.CalledProcessError, OSError):
+        try:
+            from importlib.metadata import version as package_version
+            version = "XID_plus {}".format(package_version('XID_plus'))
+        except Exception:
+            version = "Unable to determine version."
 
     return version
 
@@ -53,13 +62,16 @@ def save(priors, posterior, filename):
     with open(filename+'.pkl', 'wb') as f:
         pickle.dump({'priors':priors, 'posterior': posterior, 'version':git_version()}, f)
 
-def load(filename):
+def load(filename, mmap_mode='c'):
 
     """
 
-    :param filename: filename of xidplus data to load
+    :param filename: filename of xidplus data to load, either a pickle file (see save) or a directory (see save_columnar)
+    :param mmap_mode: (default='c') for directories, how arrays are memory mapped (see load_columnar)
     :return: list of prior classes and posterior class
     """
+    if os.path.isdir(filename):
+        return load_columnar(filename, mmap_mode=mmap_mode)
     with open(filename, "rb") as f:
         obj = pickle.load(f)
         priors=obj['priors']
@@ -67,6 +79,125 @@ def load(filename):
 
     return priors,posterior
 
+def save_columnar(priors, posterior, dirname):
+    """
+    Save xidplus priors and posterior as a directory with each array in its own .npy file and a JSON manifest
+    (manifest.json) describing the rest, so that arrays can be read individually or memory mapped (see load_columnar).
+    FITS headers are stored as text in the manifest. Other values are stored in the manifest only if JSON gives them
+    back unchanged (str, int, float, bool, None and lists or str keyed dicts of them, or a tuple of them at the top
+    level); anything else (e.g. the MOC, dicts with non-str keys, nested tuples, OrderedDicts) is pickled in its own
+    small file, so load_columnar returns the same values that were saved. Arrays are saved uncompressed, so that they
+    can be memory mapped.
+
+    :param priors: list of prior classes
+    :param posterior: posterior class, or None (e.g. for a master prior)
+    :param dirname: directory to save to, created if it does not exist
+    """
+    os.makedirs(dirname, exist_ok=True)
+    manifest = {'version': git_version(),
+                'priors': [_save_object(prior, dirname, 'prior_{}'.format(i)) for i, prior in enumerate(priors)],
+                'posterior': None if posterior is None else _save_object(posterior, dirname, 'posterior')}
+    with open(os.path.join(dirname, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+def load_columnar(dirname, mmap_mode='c', bands=None):
+    """
+    Load xidplus priors and posterior saved with save_columnar. Only the arrays of the requested priors are read and,
+    with memory mapping, array data is only read from disk when it is used.
+
+    :param dirname: directory saved with save_columnar
+    :param mmap_mode: (default='c') memory map mode for arrays (see numpy.load). 'c' (copy on write) allows arrays to be
+        modified without changing the files, 'r' is read only and None reads arrays into memory
+    :param bands: (default=None) indices of priors to load. None loads all priors
+    :return: list of prior classes and posterior class
+    """
+    with open(os.path.join(dirname, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    if bands is None:
+        bands = range(0, len(manifest['priors']))
+    priors = [_load_object(manifest['priors'][b], dirname, mmap_mode) for b in bands]
+    posterior = None
+    if manifest['posterior'] is not None:
+        posterior = _load_object(manifest['posterior'], dirname, mmap_mode)
+    return priors, posterior
+
+
+def _is_array(value):
+    return isinstance(value, (np.ndarray, np.generic)) and value.dtype != object
+
+
+def _is_json(value):
+    """Whether value is returned unchanged (including types) by a JSON round trip"""
+    if value is None or type(value) in (str, int, float, bool):
+        return True
+    if type(value) is list:
+        return all(_is_json(v) for v in value)
+    if type(value) is dict:
+        return all(type(k) is str and _is_json(v) for k, v in value.items())
+    return False
+
+
+def _save_object(obj, dirname, name):
+    """Save attributes of object for save_columnar, returning its manifest entry"""
+    from astropy.io import fits
+    entry = {'class': [type(obj).__module__, type(obj).__qualname__],
+             'arrays': {}, 'dicts': {}, 'headers': {}, 'values': {}, 'tuples': [], 'pickled': {}}
+    os.makedirs(os.path.join(dirname, name), exist_ok=True)
+    # __getstate__ leaves out attributes not to be saved, e.g. cached sparse pointing matrices
+    state = getattr(obj, '__getstate__', lambda: None)() or obj.__dict__
+    for key, value in state.items():
+        path = os.path.join(name, key)
+        if _is_array(value):
+            np.save(os.path.join(dirname, path + '.npy'), value)
+            entry['arrays'][key] = path + '.npy'
+        elif (type(value) is dict and len(value) > 0
+              and all(type(k) is str and _is_array(v) for k, v in value.items())):
+            os.makedirs(os.path.join(dirname, path), exist_ok=True)
+            entry['dicts'][key] = {}
+            for k, v in value.items():
+                np.save(os.path.join(dirname, path, k + '.npy'), v)
+                entry['dicts'][key][k] = os.path.join(path, k + '.npy')
+        elif isinstance(value, fits.Header):
+            entry['headers'][key] = value.tostring()
+        elif _is_json(value) or (type(value) is tuple and _is_json(list(value))):
+            entry['values'][key] = list(value) if type(value) is tuple else value
+            if type(value) is tuple:
+                entry['tuples'].append(key)
+        else:
+            with open(os.path.join(dirname, path + '.pkl'), 'wb') as f:
+                pickle.dump(value, f)
+            entry['pickled'][key] = path + '.pkl'
+    return entry
+
+
+def _load_array(dirname, path, mmap_mode):
+    array = np.load(os.path.join(dirname, path), mmap_mode=mmap_mode)
+    # scalars (e.g. number of sources) are saved as 0-d arrays
+    return array[()] if array.ndim == 0 else array
+
+
+def _load_object(entry, dirname, mmap_mode):
+    """Create object from its save_columnar manifest entry, without calling its __init__"""
+    from astropy.io import fits
+    cls = importlib.import_module(entry['class'][0])
+    for attr in entry['class'][1].split('.'):
+        cls = getattr(cls, attr)
+    obj = cls.__new__(cls)
+    for key, path in entry['arrays'].items():
+        setattr(obj, key, _load_array(dirname, path, mmap_mode))
+    for key, paths in entry['dicts'].items():
+        setattr(obj, key, {k: _load_array(dirname, path, mmap_mode) for k, path in paths.items()})
+    for key, header in entry['headers'].items():
+        setattr(obj, key, fits.Header.fromstring(header))
+    for key, value in entry['values'].items():
+        setattr(obj, key, tuple(value) if key in entry['tuples'] else value)
+    for key, path in entry['pickled'].items():
+        with open(os.path.join(dirname, path), 'rb') as f:
+            setattr(obj, key, pickle.load(f))
+    return obj
+
+
 class MacOSFile(object):
 
     def __init__(self, f):
@@ -90,6 +221,9 @@ class MacOSFile(object):
         return self.f.read(n)
 
     def write(self, buffer):
+        if isinstance(buffer, getattr(pickle, 'PickleBuffer', ())):
+            # protocol 5 writes large buffers directly
+            buffer = buffer.raw()
         n = len(buffer)
         print("writing total_bytes=%s..." % n, flush=True)
         idx = 0
@@ -0,0 +1,115 @@
+# init file for laplace fit functions
+
+__author__ = 'pdh21'
+
+import numpy as np
+
+
+def design_matrix(prior, sigma_conf):
+    """
+    Noise weighted design matrix for one band. The XID+ likelihood is Gaussian and linear in the source fluxes and
+    background, so given sigma_conf the fit is a weighted least squares problem. Columns are the source fluxes followed
+    by the background; the last row is the Gaussian prior on the background.
+
+    :param prior: xidplus.prior class
+    :param sigma_conf: confusion noise
+    :return: scipy sparse design matrix ((snpix+1) x (nsrc+1)), weighted data vector
+    """
+    from scipy.sparse import csr_matrix, hstack, vstack
+    sigma_tot = np.sqrt(np.power(prior.snim, 2) + sigma_conf ** 2)
+    A = prior.pointing_matrix_csr().multiply(1.0 / sigma_tot[:, None])
+    M = vstack([hstack([A, csr_matrix(1.0 / sigma_tot[:, None])]),
+                csr_matrix(([1.0 / prior.bkg[1]], ([0], [prior.nsrc])), shape=(1, prior.nsrc + 1))]).tocsr()
+    y = np.append(prior.sim / sigma_tot, prior.bkg[0] / prior.bkg[1])
+    return M, y
+
+
+def fit_band(prior, sigma_conf=None, n_iter=3):
+    """
+    MAP estimate of source fluxes and background for one band, by bounded least squares with the sparse pointing
+    matrix. The uniform flux priors set the bounds. If sigma_conf is not given, it is estimated from the residual
+    variance in excess of the instrumental noise, refitting n_iter times.
+
+    :param prior: xidplus.prior class
+    :param sigma_conf: (default=None) confusion noise. None estimates it
+    :param n_iter: (default=3) number of iterations when estimating sigma_conf, at least 1
+    :return: MAP fluxes and background (nsrc+1), sigma_conf, design matrix
+    """
+    from scipy.optimize import lsq_linear
+    lower = np.append(prior.prior_flux_lower, -np.inf)
+    upper = np.append(prior.prior_flux_upper, np.inf)
+    estimate = sigma_conf is None
+    if estimate and n_iter < 1:
+        raise ValueError("n_iter must be at least 1 to estimate sigma_conf, got {}".format(n_iter))
+    sigma_conf = 0.0 if estimate else float(sigma_conf)
+    for i in range(0, n_iter if estimate else 1):
+        M, y = design_matrix(prior, sigma_conf)
+        x = lsq_linear(M, y, bounds=(lower, upper), method='trf', lsmr_tol='auto').x
+        if estimate:
+            residual = prior.sim - prior.pointing_matrix_csr() @ x[0:prior.nsrc] - x[-1]
+            sigma_conf = float(np.sqrt(max(0.0, np.mean(np.power(residual, 2) - np.power(prior.snim, 2)))))
+    if estimate:
+        M, y = design_matrix(prior, sigma_conf)
+    return x, sigma_conf, M
+
+
+def laplace_samples(prior, x, M, nsamp=1000, rng=None):
+    """
+    Draw samples from the Laplace (Gaussian) approximation to the posterior around the MAP estimate. The precision
+    matrix H is M^T M plus, for the fluxes, the precision of a Gaussian with the variance of the uniform prior, so that
+    sources with no pixels have the prior width rather than an infinite one. Writing H = R^T R, with R the design matrix
+    with the prior rows appended, x + H^-1 R^T z (z standard normal) has covariance H^-1, so samples only need a sparse
+    LU factorisation of H and the dense covariance matrix is never built.
+
+    Samples outside the flux bounds are clipped to them. This piles the probability outside the bounds up at the bounds
+    (e.g. sources with a MAP flux of zero have about half their samples at zero): percentiles inside the bounds are
+    those of the Gaussian approximation, but the sample mean and standard deviation of such sources are not.
+
+    :param prior: xidplus.prior class
+    :param x: MAP fluxes and background, from fit_band
+    :param M: design matrix, from fit_band
+    :param nsamp: (default=1000) number of samples
+    :param rng: (default=None) numpy random Generator
+    :return: flux samples (nsamp x nsrc), background samples (nsamp)
+    """
+    from scipy.sparse import diags, vstack
+    from scipy.sparse.linalg import splu
+    if rng is None:
+        rng = np.random.default_rng()
+    width = np.asarray(prior.prior_flux_upper) - np.asarray(prior.prior_flux_lower)
+    R = vstack([M, diags(np.append(np.sqrt(12.0) / width, 0.0))]).tocsr()
+    H = (R.T @ R).tocsc()
+    samples = x[:, None] + splu(H).solve(np.asarray(R.T @ rng.standard_normal((R.shape[0], nsamp))))
+    src_f = np.clip(samples[0:prior.nsrc, :].T, prior.prior_flux_lower, prior.prior_flux_upper)
+    return src_f, samples[-1, :]
+
+
+def all_bands(priors, nsamp=1000, sigma_conf=None, n_iter=3, seed=None):
+    """
+    Fast fit of any number of bands, without MCMC. Each band is fitted with a MAP estimate (see fit_band) and samples
+    are drawn from the Laplace approximation (see laplace_samples), so the result can be used like an MCMC fit, e.g. for
+    quick-look catalogues. sigma_conf is a point estimate, so its samples are all the same value, and flux samples are
+    clipped to the prior bounds (see laplace_samples).
+
+    :param priors: list of xidplus.prior classes
+    :param nsamp: (default=1000) number of samples
+    :param sigma_conf: (default=None) confusion noise, one value for all bands or a list with one for each band. None
+        estimates it from the residuals
+    :param n_iter: (default=3) number of iterations when estimating sigma_conf, at least 1
+    :param seed: (default=None) random seed
+    :return: dictionary of 'samples' and 'map' estimates, for xidplus.posterior_laplace
+    """
+    rng = np.random.default_rng(seed)
+    if sigma_conf is None or np.isscalar(sigma_conf):
+        sigma_conf = [sigma_conf] * len(priors)
+    nsrc = priors[0].nsrc
+    samples = {'src_f': np.empty((nsamp, len(priors), nsrc)), 'bkg': np.empty((nsamp, len(priors))),
+               'sigma_conf': np.empty((nsamp, len(priors)))}
+    map_est = {'src_f': np.empty((len(priors), nsrc)), 'bkg': np.empty(len(priors)),
+               'sigma_conf': np.empty(len(priors))}
+    for b, prior in enumerate(priors):
+        x, sig, M = fit_band(prior, sigma_conf[b], n_iter)
+        samples['src_f'][:, b, :], samples['bkg'][:, b] = laplace_samples(prior, x, M, nsamp, rng)
+        samples['sigma_conf'][:, b] = sig
+        map_est['src_f'][b, :], map_est['bkg'][b], map_est['sigma_conf'][b] = x[0:nsrc], x[-1], sig
+    return {'samples': samples, 'map': map_est}
@@ -6,6 +6,9 @@ import healpy as hp
 
 import numpy as np
 
+# HEALPix order used to store positions of map pixels, finest order of a MOC
+HPIDX_ORDER = 29
+
 def get_HEALPix_pixels(order,ra,dec,unique=True):
 
 
@@ -132,11 +135,101 @@ def check_in_moc(ra, dec, moc):
         np.array(ra), np.array(dec), moc.order
     )
 
-    # Array of all the HEALpix cell ids of the MOC at its maximum order.
-    moc_healpix_cells = np.array(list(moc.flattened()))
+    return check_hpidx_in_moc(source_healpix_cells, moc.order, moc)
+
+def check_hpidx_in_moc(healpix_cells, order, moc):
+    """Find HEALPix cells in a MOC
+    Given a list of HEALPix indexes (in nested scheme) and a Multi Order
+    Coverage (MOC) map, this function return a boolean mask with True for
+    cells that fall inside the MOC and False elsewhere.
+    Parameters
+    ----------
+    healpix_cells: array of int
+        The HEALPix indexes.
+    order: int
+        HEALPix order of the indexes. Must be at least the maximum order of
+        the MOC.
+    moc: pymoc.MOC
+        The MOC read by pymoc
+    Returns
+    -------
+    array of booleans
+        The boolean mask with True for cells that fall inside the MOC.
+    """
+    source_healpix_cells = np.asarray(healpix_cells)
+
+    # Ranges of HEALPix cell ids covered by the MOC at the given order.
+    start, stop = moc_to_ranges(moc, order)
+    if start.size == 0:
+        return np.zeros(source_healpix_cells.shape, dtype=bool)
 
-    # We look for sources that are in the MOC and return the mask
-    return np.in1d(source_healpix_cells, moc_healpix_cells)
+    # We look for the last range starting at or before each source. As ranges
+    # can be nested, the source is in the MOC if it is before the furthest
+    # end of all ranges up to that one.
+    stop = np.maximum.accumulate(stop)
+    ind = np.searchsorted(start, source_healpix_cells, side='right') - 1
+    return (ind >= 0) & (source_healpix_cells < stop[np.clip(ind, 0, None)])
+
+def sorted_hpidx_in_moc(sorted_healpix_cells, order, moc):
+    """Find HEALPix cells in a MOC, for sorted cells
+    Like check_hpidx_in_moc, but for cells sorted in increasing order, the
+    cells in each range of the MOC are found by binary search, so only the
+    cells at the edges of each range (and those in it) are read. This makes
+    it suitable for memory mapped arrays of cells.
+    Parameters
+    ----------
+    sorted_healpix_cells: array of int
+        The HEALPix indexes, sorted in increasing order.
+    order: int
+        HEALPix order of the indexes. Must be at least the maximum order of
+        the MOC.
+    moc: pymoc.MOC
+        The MOC read by pymoc
+    Returns
+    -------
+    array of int
+        The (increasing) positions of the cells that fall inside the MOC.
+    """
+    start, stop = moc_to_ranges(moc, order)
+    first = np.searchsorted(sorted_healpix_cells, start, side='left')
+    last = np.searchsorted(sorted_healpix_cells, stop, side='left')
+    index = [np.arange(i, j, dtype=np.int64) for i, j in zip(first, last) if j > i]
+    if len(index) == 0:
+        return np.array([], dtype=np.int64)
+    # ranges of a MOC that is not normalised can overlap
+    return np.unique(np.concatenate(index))
+
+def moc_to_ranges(moc, order=None):
+    """Convert MOC to ranges of HEALPix cells
+    Each cell of the MOC is converted to the range of cell ids it covers at
+    the given order, without expanding it into those cells.
+    Parameters
+    ----------
+    moc: pymoc.MOC
+        The MOC read by pymoc
+    order: int
+        HEALPix order of the ranges. Defaults to the maximum order of the MOC.
+    Returns
+    -------
+    tuple of arrays of int
+        The start (inclusive) and stop (exclusive) of each range, sorted by
+        start.
+    """
+    if order is None:
+        order = moc.order
+    elif order < moc.order:
+        raise ValueError('order ({}) is less than MOC order ({})'.format(order, moc.order))
+    start = [np.array([], dtype=np.int64)]
+    stop = [np.array([], dtype=np.int64)]
+    for moc_order, cells in moc:
+        cells = np.fromiter(cells, dtype=np.int64, count=len(cells))
+        shift = 2 * (order - moc_order)
+        start.append(cells << shift)
+        stop.append((cells + 1) << shift)
+    start = np.concatenate(start)
+    stop = np.concatenate(stop)
+    ind = np.argsort(start, kind='stable')
+    return start[ind], stop[ind]
 
 def check_in_moc_pdh(ra,dec,moc):
     """Check whether a source is in MOC or not
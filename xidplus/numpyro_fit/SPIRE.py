@@ -8,7 +8,7 @@ from jax import random
 import numpy as np
 import jax
 import os
-numpyro.set_host_device_count(os.cpu_count())
+from xidplus.numpyro_fit import check_chain_method
 
 @jax.partial(jax.jit, static_argnums=(2))
 def sp_matmul(A, B, shape):
@@ -62,8 +62,19 @@ def spire_model(priors):
                                  obs=priors[2].sim)
 
 def all_bands(priors,num_samples=500,num_warmup=500,num_chains=4,chain_method='parallel'):
-    numpyro.set_host_device_count(4)
+    """
+    Fit the three SPIRE bands.
+
+    :param priors: list of xidplus.prior classes
+    :param num_samples: number of samples per chain
+    :param num_warmup: number of warmup steps per chain
+    :param num_chains: number of chains
+    :param chain_method: numpyro chain method ('parallel', 'sequential' or 'vectorized'), see
+        xidplus.numpyro_fit.check_chain_method
+    :return: numpyro MCMC object
+    """
     nuts_kernel = NUTS(spire_model)
+    chain_method = check_chain_method(num_chains, chain_method)
     mcmc = MCMC(nuts_kernel, num_samples=num_samples, num_warmup=num_warmup,num_chains=num_chains,chain_method=chain_method)
     rng_key = random.PRNGKey(0)
     mcmc.run(rng_key, priors)
@@ -0,0 +1,26 @@
+# init file for numpyro fit functions
+"""
+Fits with numpyro. Chains run in parallel with chain_method='parallel' need one jax device for each chain. On CPU, jax
+has one device unless numpyro.set_host_device_count(num_chains) is called before jax is first used; with fewer devices
+than chains the fit functions fall back to running the chains sequentially (see check_chain_method).
+"""
+
+__author__ = 'pdh21'
+
+
+def check_chain_method(num_chains, chain_method):
+    """
+    Chain method that can be run with the available jax devices. 'parallel' needs a device for each chain, otherwise
+    warn and use 'sequential'.
+
+    :param num_chains: number of chains
+    :param chain_method: numpyro chain method ('parallel', 'sequential' or 'vectorized')
+    :return: chain method
+    """
+    import warnings
+    import jax
+    if chain_method == 'parallel' and jax.local_device_count() < num_chains:
+        warnings.warn("{} chains but {} jax devices, running chains sequentially. Call numpyro.set_host_device_count "
+                      "before jax is first used to run them in parallel".format(num_chains, jax.local_device_count()))
+        return 'sequential'
+    return chain_method
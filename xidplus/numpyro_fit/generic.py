@@ -0,0 +1,249 @@
+__author__ = 'pdh21'
+
+import numpyro
+import numpyro.distributions as dist
+from numpyro.infer import MCMC, NUTS
+import jax.numpy as jnp
+from jax import random
+import numpy as np
+import jax
+from typing import NamedTuple
+from xidplus.numpyro_fit import check_chain_method
+
+
+def fused_pointing_matrix(priors, nsrc=None):
+    """
+    Combine the pointing matrices of all bands into one block diagonal sparse matrix. The pixels of each band are
+    offset by the number of pixels in previous bands and sources by band*nsrc, so the model maps of all bands are
+    calculated with one multiply by the band major flattened flux array (src_f.T.reshape(-1)).
+
+    :param priors: list of xidplus.prior classes, with the same sources
+    :param nsrc: (default=None) number of sources per band in flux array, if padded. None uses priors[0].nsrc
+    :return: rows, cols, values of fused pointing matrix, band of each pixel
+    """
+    if nsrc is None:
+        nsrc = priors[0].nsrc
+    pix_offset = np.cumsum([0] + [p.snpix for p in priors])
+    rows = np.concatenate([p.amat_row + pix_offset[b] for b, p in enumerate(priors)])
+    cols = np.concatenate([p.amat_col + b * nsrc for b, p in enumerate(priors)])
+    values = np.concatenate([p.amat_data for p in priors])
+    pix_band = np.repeat(np.arange(len(priors)), [p.snpix for p in priors])
+    return rows, cols, values, pix_band
+
+
+class model_data(NamedTuple):
+    """Prior data for multi_band_model as jax arrays. A NamedTuple is a jax pytree, so it can be passed to jitted
+    functions; tiles whose arrays have the same shapes share compiled code"""
+    rows: jnp.ndarray
+    cols: jnp.ndarray
+    values: jnp.ndarray
+    pix_band: jnp.ndarray
+    sim: jnp.ndarray
+    snim: jnp.ndarray
+    flux_lower: jnp.ndarray
+    flux_upper: jnp.ndarray
+    bkg_mu: jnp.ndarray
+    bkg_sig: jnp.ndarray
+    pix_mask: jnp.ndarray
+
+
+def bucket_size(n, min_size=64):
+    """Size padded up to, the next power of two (and at least min_size), so tiles fall into a few shape buckets
+
+    :param n: size
+    :param min_size: smallest bucket
+    :return: bucket size
+    """
+    return int(max(min_size, 2 ** int(np.ceil(np.log2(max(n, 1))))))
+
+
+def pad(array, size, value):
+    """Pad first axis of array to size with value"""
+    array = np.asarray(array)
+    padding = np.full((size - array.shape[0],) + array.shape[1:], value, dtype=array.dtype)
+    return np.concatenate([array, padding])
+
+
+def bucket_sizes(priors):
+    """Bucket sizes (see bucket_size) of sources, pixels and pointing matrix entries for priors
+
+    :param priors: list of xidplus.prior classes, with the same sources
+    :return: number of sources, pixels and pointing matrix entries, padded to bucket sizes
+    """
+    return (bucket_size(priors[0].nsrc), bucket_size(sum(p.snpix for p in priors)),
+            bucket_size(sum(p.amat_data.size for p in priors)))
+
+
+def prepare_data(priors, bucket=False, sizes=None):
+    """
+    Convert priors to the data used by multi_band_model and move it onto the device, once per fit rather than every
+    time the model is traced
+
+    With bucket=True, pixels, sources and pointing matrix entries are padded up to bucket sizes (see bucket_size), so
+    that tiles of similar size have data of the same shapes and share one compiled sampler. Padding pixels are masked
+    out of the likelihood, padding pointing matrix entries are zero and padding sources contribute to no pixels; their
+    samples are removed by get_posterior.
+
+    :param priors: list of xidplus.prior classes, with the same sources
+    :param bucket: (default=False) pad to bucket sizes
+    :param sizes: (default=None) number of sources, pixels and pointing matrix entries to pad to, e.g. to give a set of
+        tiles the same shapes. Overrides bucket
+    :return: model_data
+    """
+    npix = sum(p.snpix for p in priors)
+    if sizes is not None:
+        nsrc_pad, npix_pad, nnz_pad = sizes
+    elif bucket:
+        nsrc_pad, npix_pad, nnz_pad = bucket_sizes(priors)
+    else:
+        nsrc_pad, npix_pad, nnz_pad = priors[0].nsrc, npix, sum(p.amat_data.size for p in priors)
+
+    rows, cols, values, pix_band = fused_pointing_matrix(priors, nsrc_pad)
+    data = model_data(rows=pad(rows, nnz_pad, 0), cols=pad(cols, nnz_pad, 0), values=pad(values, nnz_pad, 0),
+                      pix_band=pad(pix_band, npix_pad, 0),
+                      sim=pad(np.concatenate([p.sim for p in priors]), npix_pad, 0),
+                      snim=pad(np.concatenate([p.snim for p in priors]), npix_pad, 1),
+                      flux_lower=pad(np.asarray([p.prior_flux_lower for p in priors]).T, nsrc_pad, 0),
+                      flux_upper=pad(np.asarray([p.prior_flux_upper for p in priors]).T, nsrc_pad, 1),
+                      bkg_mu=np.asarray([p.bkg[0] for p in priors]),
+                      bkg_sig=np.asarray([p.bkg[1] for p in priors]),
+                      pix_mask=pad(np.ones(npix, dtype=bool), npix_pad, False))
+    return jax.device_put(jax.tree_util.tree_map(jnp.asarray, data))
+
+
+def multi_band_model(data):
+    """
+    XID+ model for any number of bands. All bands are fitted with a single fused pointing matrix
+    (see fused_pointing_matrix), so each evaluation does one segment_sum and one likelihood over all pixels.
+
+    :param data: model_data, from prepare_data
+    """
+    nband = data.bkg_mu.shape[0]
+    nsrc = data.flux_lower.shape[0]
+    npix = data.sim.shape[0]
+
+    with numpyro.plate('bands', nband):
+        sigma_conf = numpyro.sample('sigma_conf', dist.HalfCauchy(1.0))
+        bkg = numpyro.sample('bkg', dist.Normal(data.bkg_mu, data.bkg_sig))
+        with numpyro.plate('nsrc', nsrc):
+            src_f = numpyro.sample('src_f', dist.Uniform(data.flux_lower, data.flux_upper))
+
+    # model map of all bands, (src_f is nsrc x nband, fused source index is band*nsrc+source)
+    db_hat = jax.ops.segment_sum(data.values * src_f.T.reshape(-1)[data.cols], data.rows, npix) + bkg[data.pix_band]
+    sigma_tot = jnp.sqrt(jnp.power(data.snim, 2) + jnp.power(sigma_conf[data.pix_band], 2))
+
+    with numpyro.plate('pixels', npix):
+        numpyro.sample("obs", dist.Normal(db_hat, sigma_tot).mask(data.pix_mask), obs=data.sim)
+
+
+def all_bands(priors, num_samples=500, num_warmup=500, num_chains=4, chain_method='parallel', mcmc=None,
+              bucket=False):
+    """
+    Fit any number of bands (e.g. MIPS, PACS and SPIRE together) with multi_band_model.
+
+    :param priors: list of xidplus.prior classes, with the same sources
+    :param num_samples: number of samples per chain
+    :param num_warmup: number of warmup steps per chain
+    :param num_chains: number of chains
+    :param chain_method: numpyro chain method ('parallel', 'sequential' or 'vectorized'), see
+        xidplus.numpyro_fit.check_chain_method
+    :param mcmc: (default=None) MCMC object returned by a previous call. Reusing it for tiles with data of the same
+        shapes reuses the compiled sampler
+    :param bucket: (default=False) pad data to bucket sizes (see prepare_data), so a long running process fitting many
+        tiles compiles the sampler once per bucket. Use get_posterior to remove padding sources
+    :return: numpyro MCMC object, for get_posterior
+    """
+    data = prepare_data(priors, bucket=bucket)
+    if mcmc is None:
+        nuts_kernel = NUTS(multi_band_model)
+        mcmc = MCMC(nuts_kernel, num_samples=num_samples, num_warmup=num_warmup, num_chains=num_chains,
+                    chain_method=check_chain_method(num_chains, chain_method), jit_model_args=True)
+    rng_key = random.PRNGKey(0)
+    mcmc.run(rng_key, data)
+    return mcmc
+
+
+def get_posterior(mcmc, priors):
+    """
+    Posterior from fit, removing any padding sources (see prepare_data)
+
+    :param mcmc: numpyro MCMC object from all_bands
+    :param priors: list of xidplus.prior classes used in fit
+    :return: xidplus.posterior_numpyro class
+    """
+    from xidplus.posterior import posterior_numpyro
+    return unpad_posterior(posterior_numpyro(mcmc, priors), priors[0].nsrc)
+
+
+def unpad_posterior(posterior, nsrc):
+    """Remove padding sources from posterior
+
+    :param posterior: xidplus.posterior_numpyro class
+    :param nsrc: number of sources fitted
+    :return: posterior
+    """
+    posterior.samples['src_f'] = posterior.samples['src_f'][:, :, 0:nsrc]
+    posterior.Rhat['src_f'] = posterior.Rhat['src_f'][0:nsrc]
+    posterior.n_eff['src_f'] = posterior.n_eff['src_f'][0:nsrc]
+    return posterior
+
+
+def sample_tile(rng_key, data, num_warmup, num_samples):
+    """
+    Run one NUTS chain for one tile with numpyro's functional interface, so that it can be vectorised over chains and
+    tiles with jax.vmap
+
+    :param rng_key: jax random key
+    :param data: model_data
+    :param num_warmup: number of warmup steps
+    :param num_samples: number of samples
+    :return: dictionary of samples, divergences
+    """
+    from numpyro.infer.util import initialize_model
+    from numpyro.infer.hmc import hmc
+    init_key, sample_key = random.split(rng_key)
+    init_params, potential_fn_gen, postprocess_fn, _ = initialize_model(init_key, multi_band_model,
+                                                                        model_args=(data,), dynamic_args=True)
+    init_kernel, sample_kernel = hmc(potential_fn_gen=potential_fn_gen, algo='NUTS')
+    state = init_kernel(init_params, num_warmup, model_args=(data,), rng_key=sample_key)
+
+    def step(state, _):
+        state = sample_kernel(state, model_args=(data,))
+        return state, (state.z, state.diverging)
+
+    state, _ = jax.lax.scan(step, state, None, length=num_warmup)
+    state, (z, diverging) = jax.lax.scan(step, state, None, length=num_samples)
+    return jax.vmap(postprocess_fn(data))(z), diverging
+
+
+def all_tiles(tiles, num_samples=500, num_warmup=500, num_chains=4, seed=0):
+    """
+    Fit many tiles at once in one process. All tiles are padded to the same (largest) bucket sizes, stacked and every
+    chain of every tile is run together, vectorised with jax.vmap, so the sampler is compiled once and small tiles
+    keep the device busy. Tiles must have the same number of bands.
+
+    :param tiles: list of tiles, each a list of xidplus.prior classes
+    :param num_samples: number of samples per chain
+    :param num_warmup: number of warmup steps per chain
+    :param num_chains: number of chains per tile
+    :param seed: random seed
+    :return: list of xidplus.posterior_numpyro classes, one for each tile
+    """
+    from functools import partial
+    from xidplus.posterior import posterior_numpyro
+    sizes = tuple(np.max([bucket_sizes(priors) for priors in tiles], axis=0))
+    data = [prepare_data(priors, sizes=sizes) for priors in tiles]
+    batch = jax.tree_util.tree_map(lambda *x: jnp.stack(x), *data)
+    rng_keys = random.split(random.PRNGKey(seed), len(tiles) * num_chains).reshape(len(tiles), num_chains, -1)
+
+    sample = partial(sample_tile, num_warmup=num_warmup, num_samples=num_samples)
+    # vectorise over chains (same data) and then over tiles
+    sample = jax.jit(jax.vmap(jax.vmap(sample, in_axes=(0, None)), in_axes=(0, 0)))
+    samples, diverging = jax.device_get(sample(rng_keys, batch))
+
+    posteriors = []
+    for t, priors in enumerate(tiles):
+        sites = {k: v[t] for k, v in samples.items()}
+        posteriors.append(unpad_posterior(posterior_numpyro.from_samples(sites, diverging[t], priors),
+                                          priors[0].nsrc))
+    return posteriors
@@ -55,10 +55,20 @@ class posterior_pyro(object):
             self.samples['sigma_conf'] = self.samples['sigma_conf'][:, None]
 
 
+class posterior_laplace(object):
+    def __init__(self, fit, priors):
+        """ Class for dealing with posterior from the Laplace approximation fit (xidplus.laplace_fit)
+
+        :param fit: fit dictionary from xidplus.laplace_fit
+        :param priors: list of prior classes used for fit
+        """
+        self.nsrc=priors[0].nsrc
+        self.samples=fit['samples']
+        self.map=fit['map']
+
+
 class posterior_numpyro(object):
     def __init__(self, mcmc, priors):
-        from numpyro.diagnostics import print_summary, summary
-
         from operator import attrgetter
 
         """ Class for dealing with posterior from numpyro
@@ -66,11 +76,7 @@ class posterior_numpyro(object):
         :param fit: fit object from numpyro
         :param priors: list of prior classes used for fit
         """
-        self.nsrc=priors[0].nsrc
-        self.samples=mcmc.get_samples()
-        self.samples['src_f']=np.swapaxes(self.samples['src_f'],1,2)
         # get summary statistics. Code based on numpyro print_summary
-        prob = 0.9
         exclude_deterministic = True
         sites = mcmc._states[mcmc._sample_field]
         if isinstance(sites, dict) and exclude_deterministic:
@@ -84,8 +90,37 @@ class posterior_numpyro(object):
                 sites = {k: v for k, v in mcmc._states[mcmc._sample_field].items()
                          if k in state_sample_field}
 
+        self.set_samples(mcmc.get_samples(), sites, mcmc.get_extra_fields()['diverging'], priors)
+
+    @classmethod
+    def from_samples(cls, sites, diverge, priors):
+        """ Create posterior from samples grouped by chain, e.g. from samplers run without a numpyro MCMC object
+
+        :param sites: dictionary of samples, each of shape (chains, samples, ...)
+        :param diverge: divergences, of shape (chains, samples)
+        :param priors: list of prior classes used for fit
+        :return: posterior_numpyro class
+        """
+        samples = {k: np.reshape(v, (-1,) + np.shape(v)[2:]) for k, v in sites.items()}
+        posterior = cls.__new__(cls)
+        posterior.set_samples(samples, sites, np.reshape(diverge, -1), priors)
+        return posterior
+
+    def set_samples(self, samples, sites, diverge, priors):
+        """ Set samples and convergence statistics
+
+        :param samples: dictionary of samples, with chains combined
+        :param sites: dictionary of samples grouped by chain, for convergence statistics
+        :param diverge: divergences
+        :param priors: list of prior classes used for fit
+        """
+        from numpyro.diagnostics import summary
+
+        self.nsrc=priors[0].nsrc
+        self.samples=samples
+        self.samples['src_f']=np.swapaxes(self.samples['src_f'],1,2)
+        prob = 0.9
         stats_summary = summary(sites, prob=prob)
-        diverge = mcmc.get_extra_fields()['diverging']
 
         self.Rhat = {'src_f': stats_summary['src_f']['r_hat'],
                      'sigma_conf': stats_summary['sigma_conf']['r_hat'],
@@ -97,8 +132,8 @@ class posterior_numpyro(object):
         self.divergences=diverge
         print("Number of divergences: {}".format(np.sum(diverge)))
 
+        # single band models without a band plate give samples of shape (nsamp,), add band axis
         if len(priors) < 2:
-            self.samples['bkg']=self.samples['bkg'][:,None]
-            self.samples['sigma_conf'] = self.samples['sigma_conf'][:, None]
-
-
+            for key in ['bkg', 'sigma_conf']:
+                if np.ndim(self.samples[key]) == 1:
+                    self.samples[key]=self.samples[key][:,None]
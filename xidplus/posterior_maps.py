@@ -12,12 +12,8 @@ def ymod_map(prior,flux):
     :param flux: flux vector
     :return: map array, in same format as prior.sim
     """
-    from scipy.sparse import coo_matrix
-
-    f=coo_matrix((flux, (range(0,prior.nsrc),np.zeros(prior.nsrc))), shape=(prior.nsrc, 1))
-    A=coo_matrix((prior.amat_data, (prior.amat_row, prior.amat_col)), shape=(prior.snpix, prior.nsrc))
-    rmap_temp=(A*f)
-    return np.asarray(rmap_temp.todense())
+    rmap_temp=prior.pointing_matrix_csr()@np.asarray(flux).reshape(prior.nsrc,1)
+    return np.asarray(rmap_temp)
 
 
 def Bayesian_pvals(prior,post_rep_map):
@@ -28,9 +24,7 @@ def Bayesian_pvals(prior,post_rep_map):
     :return: Bayesian P values
     """
     pval=np.empty_like(prior.sim)
-    for i in range(0,prior.snpix):
-        ind=post_rep_map[i,:]<prior.sim[i]
-        pval[i]=sum(ind)/np.float(post_rep_map.shape[1])
+    pval[:]=np.mean(post_rep_map<prior.sim[:,None],axis=1)
     pval[np.isposinf(pval)]=1.0
     #pval[np.isneginf(pval)]=0.0
     return pval
@@ -42,31 +36,58 @@ def make_Bayesian_pval_maps(prior,post_rep_map):
     :param post_rep_map: posterior replicated maps
     :return: Bayesian P values converted to sigma level
     """
-    pval=Bayesian_pvals(prior,post_rep_map)
-    for i in range(0,prior.snpix):
-        pval[i]=st.norm.ppf(pval[i])
+    pval=st.norm.ppf(Bayesian_pvals(prior,post_rep_map))
     pval[np.isposinf(pval)]=6.0
     pval[np.isneginf(pval)]=-6.0
     return pval
 
 
-def Bayes_Pval_res(prior,post_rep_map):
+def Bayes_Pval_res(prior,post_rep_map,chunk_size=100):
     """The local Bayesian P value residual statistic. 
     
     
     :param prior: xidplus.prior class
     :param post_rep_map: posterior replicated maps
+    :param chunk_size: (default=100) number of replicated maps processed at once, to limit memory
     :return: Bayesian P value residual statistic for each source
     """
-    Bayes_pval_res_vals=np.empty((prior.nsrc))
-    for i in range(0,prior.nsrc):
-        ind= prior.amat_col == i
-        t = np.sum(((post_rep_map[prior.amat_row[ind], :] - prior.sim[prior.amat_row[ind], None]) / (
-        np.sqrt(2) * prior.snim[prior.amat_row[ind], None])) ** 2.0, axis=0)
-        ind_T = t / ind.sum() > 2
-        Bayes_pval_res_vals[i] = ind_T.sum()/np.float(post_rep_map.shape[1])
+    nrep=post_rep_map.shape[1]
+    count=np.zeros((prior.nsrc))
+    A=binary_pointing_matrix(prior)
+    for i in range(0,nrep,chunk_size):
+        count+=Bayes_Pval_res_count(prior,post_rep_map[:,i:i+chunk_size],A)
+    return count/np.float64(nrep)
+
+
+def binary_pointing_matrix(prior):
+    """Pointing matrix with every entry set to one, sharing the index arrays of the cached csc pointing matrix
 
-    return Bayes_pval_res_vals
+    :param prior: xidplus.prior class
+    :return: scipy csc matrix (snpix x nsrc)
+    """
+    from scipy.sparse import csc_matrix
+    A=prior.pointing_matrix_csc()
+    return csc_matrix((np.ones_like(A.data),A.indices,A.indptr),shape=A.shape,copy=False)
+
+
+def Bayes_Pval_res_count(prior,post_rep_map,A=None):
+    """Number of replicated maps for which each source fails the local Bayesian P value residual test. Squared
+    residuals are calculated once per pixel and summed for each source with the (binary) pointing matrix.
+
+    :param prior: xidplus.prior class
+    :param post_rep_map: posterior replicated maps (or a block of them)
+    :param A: (default=None) binary pointing matrix from binary_pointing_matrix, to reuse over blocks of maps
+    :return: count for each source
+    """
+    if A is None:
+        A=binary_pointing_matrix(prior)
+    npix=np.diff(A.indptr)
+    res=((post_rep_map-prior.sim[:,None])/(np.sqrt(2)*prior.snim[:,None]))**2.0
+    t=A.T@res
+    # sources that contribute to no pixels never fail the test
+    with np.errstate(invalid='ignore',divide='ignore'):
+        ind_T=t/npix[:,None] > 2
+    return ind_T.sum(axis=1)
 
 
 
@@ -86,26 +107,124 @@ def make_fits_image(prior,pixel_values):
 
     return hdulist
 
-def replicated_maps(priors,posterior,nrep=1000):
+def n_replicates(posterior,nrep):
+    """Number of replicated maps that can be made from posterior. Each replicated map uses one posterior sample, so
+    nrep is limited to the number of samples
+
+    :param posterior: xidplus.posterior class
+    :param nrep: number of replicated maps requested
+    :return: number of replicated maps
+    """
+    return min(int(nrep),np.shape(posterior.samples['src_f'])[0])
+
+
+def replicated_maps(priors,posterior,nrep=1000,chunk_size=None,seed=None):
     """Create posterior replicated maps
 
+    The model maps for a block of posterior samples are calculated with a single sparse-dense multiply (A*F) per band
+    and the noise for the block is drawn at once.
+
     :param priors: list of xidplus.prior class
     :param posterior: xidplus.posterior class
-    :param nrep: number of replicated maps
-    :return: 
+    :param nrep: number of replicated maps, at most the number of posterior samples (see n_replicates)
+    :param chunk_size: (default=None) number of replicated maps calculated at once, to limit memory. None does all nrep at once
+    :param seed: (default=None) seed for noise, for reproducible replicated maps. Results do not depend on chunk_size
+    :return: list of replicated map arrays (snpix x nrep), one for each prior
     """
+    nrep=n_replicates(posterior,nrep)
     mod_map_array=list(map(lambda prior:np.empty((prior.snpix,nrep)), priors))
-    for i in range(0,nrep):
-        try:
-            for b in range(0,len(priors)):
-                mod_map_array[b][:,i]= ymod_map(priors[b],posterior.samples['src_f'][i,b,:]).reshape(-1)\
-                                       +posterior.samples['bkg'][i,b]\
-                                       +np.random.normal(scale=np.sqrt(priors[b].snim**2
-                                                                       +posterior.samples['sigma_conf'][i,b]**2))
-        except IndexError:
-            for b in range(0,len(priors)):
-                mod_map_array[b][:,i]= ymod_map(priors[b],posterior.samples['src_f'][i,b,:]).reshape(-1)\
-                                       +posterior.samples['bkg'][i]\
-                                       +np.random.normal(scale=np.sqrt(priors[b].snim**2
-                                                                       +posterior.samples['sigma_conf'][i]**2))
-    return mod_map_array
\ No newline at end of file
+    for i,j,blocks in replicated_map_chunks(priors,posterior,nrep,chunk_size,seed):
+        for b in range(0,len(priors)):
+            mod_map_array[b][:,i:j]=blocks[b]
+    return mod_map_array
+
+
+def replicated_map_chunks(priors,posterior,nrep=1000,chunk_size=None,seed=None):
+    """Generate posterior replicated maps in blocks of replicates
+
+    :param priors: list of xidplus.prior class
+    :param posterior: xidplus.posterior class
+    :param nrep: number of replicated maps, at most the number of posterior samples (see n_replicates)
+    :param chunk_size: (default=None) number of replicated maps in each block. None does all nrep at once
+    :param seed: (default=None) seed for noise. Results do not depend on chunk_size
+    :return: generator of (first replicate, last replicate (exclusive), list of replicated map blocks, one for each prior)
+    """
+    nrep=n_replicates(posterior,nrep)
+    # independent noise stream for each band
+    rngs=[np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(len(priors))]
+    if chunk_size is None:
+        chunk_size=nrep
+    for i in range(0,nrep,chunk_size):
+        j=min(i+chunk_size,nrep)
+        blocks=[]
+        for b in range(0,len(priors)):
+            bkg,sigma_conf=sample_bkg_sigma_conf(posterior,b,i,j)
+            blocks.append(priors[b].pointing_matrix_csr()@np.asarray(posterior.samples['src_f'][i:j,b,:]).T
+                          +bkg
+                          +rngs[b].normal(size=(j-i,priors[b].snpix)).T*np.sqrt(priors[b].snim[:,None]**2
+                                                                               +sigma_conf**2))
+        yield i,j,blocks
+
+
+def Bayes_Pval_res_stream(priors,posterior,nrep=1000,chunk_size=100,seed=None):
+    """The local Bayesian P value residual statistic for each band, accumulated over blocks of replicated maps so
+    that the full set of replicated maps is never held in memory
+
+    :param priors: list of xidplus.prior class
+    :param posterior: xidplus.posterior class
+    :param nrep: number of replicated maps, at most the number of posterior samples (see n_replicates)
+    :param chunk_size: (default=100) number of replicated maps generated at once
+    :param seed: (default=None) seed for noise
+    :return: list of Bayesian P value residual statistic for each source, one for each prior
+    """
+    nrep=n_replicates(posterior,nrep)
+    count=[np.zeros((prior.nsrc)) for prior in priors]
+    A=[binary_pointing_matrix(prior) for prior in priors]
+    for i,j,blocks in replicated_map_chunks(priors,posterior,nrep,chunk_size,seed):
+        for b in range(0,len(priors)):
+            count[b]+=Bayes_Pval_res_count(priors[b],blocks[b],A[b])
+    return [c/np.float64(nrep) for c in count]
+
+
+def Bayesian_pval_maps_stream(priors,posterior,nrep=1000,chunk_size=100,seed=None):
+    """Bayesian P value maps (quoted as sigma level, see make_Bayesian_pval_maps) for each band, accumulated over
+    blocks of replicated maps so that the full set of replicated maps is never held in memory
+
+    :param priors: list of xidplus.prior class
+    :param posterior: xidplus.posterior class
+    :param nrep: number of replicated maps, at most the number of posterior samples (see n_replicates)
+    :param chunk_size: (default=100) number of replicated maps generated at once
+    :param seed: (default=None) seed for noise
+    :return: list of Bayesian P values converted to sigma level, one for each prior
+    """
+    nrep=n_replicates(posterior,nrep)
+    count=[np.zeros((prior.snpix)) for prior in priors]
+    for i,j,blocks in replicated_map_chunks(priors,posterior,nrep,chunk_size,seed):
+        for b in range(0,len(priors)):
+            count[b]+=np.sum(blocks[b]<priors[b].sim[:,None],axis=1)
+    pvals=[]
+    for c in count:
+        pval=st.norm.ppf(c/np.float64(nrep))
+        pval[np.isposinf(pval)]=6.0
+        pval[np.isneginf(pval)]=-6.0
+        pvals.append(pval)
+    return pvals
+
+
+def sample_bkg_sigma_conf(posterior,band,start,stop):
+    """Get background and confusion noise posterior samples for a band
+
+    :param posterior: xidplus.posterior class
+    :param band: index of band
+    :param start: first sample
+    :param stop: last sample (exclusive)
+    :return: background and confusion noise samples, each of shape (stop-start,)
+    """
+    bkg=np.asarray(posterior.samples['bkg'])
+    sigma_conf=np.asarray(posterior.samples['sigma_conf'])
+    # samples shared across bands are stored without a band axis
+    if bkg.ndim > 1:
+        bkg=bkg[:,band]
+    if sigma_conf.ndim > 1:
+        sigma_conf=sigma_conf[:,band]
+    return bkg[start:stop],sigma_conf[start:stop]
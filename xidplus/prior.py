@@ -4,41 +4,183 @@ from astropy import wcs
 from xidplus import moc_routines
 
 
+def _nearest_index(scale, s, rs, d):
+    """Index of the nearest point in prf scale, centred on each source, for each value in d
+
+    :param scale: n array, pixel scale of prf array
+    :param s: m array, source positions (in pixels)
+    :param rs: m array, source positions rounded to nearest pixel
+    :param d: m x k array of positions
+    :return: m x k array of indices into scale
+    """
+    grid = scale[None, :] + s[:, None] - rs[:, None]
+    ind = np.clip(np.searchsorted(scale, d - (s - rs)[:, None]), 1, scale.size - 1)
+    lower = np.take_along_axis(grid, ind - 1, axis=1)
+    upper = np.take_along_axis(grid, ind, axis=1)
+    return np.where((d - lower) ** 2 <= (d - upper) ** 2, ind - 1, ind)
+
+
 class prior(object):
+    # precision of map values and indices, see set_precision
+    precision = 'double'
+
     def cut_down_map(self):
         """Cuts down prior class variables associated with the map data to the MOC assigned to the prior class: self.moc
         """
+        if not hasattr(self, 'spix_hpidx'):
+            self.set_pixel_hpidx()
+        if getattr(self, 'spix_hpidx_sorted', False):
+            # only the pixels in the MOC are read, e.g. from memory mapped arrays (see sort_by_hpidx)
+            ind_map = moc_routines.sorted_hpidx_in_moc(self.spix_hpidx, moc_routines.HPIDX_ORDER, self.moc)
+        else:
+            ind_map = moc_routines.check_hpidx_in_moc(self.spix_hpidx, moc_routines.HPIDX_ORDER, self.moc)
+        # now cut down and flatten maps (default is to use all pixels, running segment will change the values below to pixels within segment)
+        self.select_pixels(ind_map)
+
+    def select_pixels(self, ind):
+        """Select map pixels, updating all variables associated with the map data
+
+        :param ind: boolean mask or index array into flattened map arrays
+        """
+        self.sx_pix = self.sx_pix[ind]
+        self.sy_pix = self.sy_pix[ind]
+        self.spix_hpidx = self.spix_hpidx[ind]
+        self.snim = self.snim[ind]
+        self.sim = self.sim[ind]
+        self.snpix = self.sim.size
+        self.clear_pixel_index()
+
+    def set_pixel_hpidx(self):
+        """Calculate HEALPix index (nested scheme, at finest order moc_routines.HPIDX_ORDER) of each map pixel, so
+        cutting down the map to a MOC does not need any further WCS transformations
+        """
         wcs_temp = wcs.WCS(self.imhdu)
         ra, dec = wcs_temp.wcs_pix2world(self.sx_pix, self.sy_pix, 0)
-        ind_map = np.array(moc_routines.check_in_moc(ra, dec, self.moc))
-        # now cut down and flatten maps (default is to use all pixels, running segment will change the values below to pixels within segment)
-        self.sx_pix = self.sx_pix[ind_map]
-        self.sy_pix = self.sy_pix[ind_map]
-        self.snim = self.snim[ind_map]
-        self.sim = self.sim[ind_map]
-        self.snpix = sum(ind_map)
+        self.spix_hpidx = moc_routines.coords_to_hpidx(ra, dec, moc_routines.HPIDX_ORDER)
+
+    def set_pixel_index(self):
+        """Build lookup grid from map pixel (y, x) to position in the flattened map arrays (sx_pix, sy_pix, sim, snim).
+        Pixels not in the map are set to -1. Built on first use by pixel_lookup and cleared whenever the map is cut
+        down, so a full field prior that is only cut into tiles never holds a grid over the whole map.
+        """
+        if self.snpix > 0:
+            x0, y0 = self.sx_pix.min(), self.sy_pix.min()
+            self.pix_index = np.full((self.sy_pix.max() - y0 + 1, self.sx_pix.max() - x0 + 1), -1,
+                                     dtype=self.index_dtype)
+            self.pix_index[self.sy_pix - y0, self.sx_pix - x0] = np.arange(0, self.snpix, dtype=self.index_dtype)
+        else:
+            x0, y0 = 0, 0
+            self.pix_index = np.full((0, 0), -1, dtype=self.index_dtype)
+        self.pix_index_origin = (x0, y0)
+
+    def clear_pixel_index(self):
+        """Remove pixel lookup grid (see set_pixel_index), so it is rebuilt for the current map when next needed"""
+        self.__dict__.pop('pix_index', None)
+        self.__dict__.pop('pix_index_origin', None)
+
+    def pixel_lookup(self, x, y):
+        """Find position of map pixels in flattened map arrays
+
+        :param x: x pixel (broadcastable with y)
+        :param y: y pixel (broadcastable with x)
+        :return: index into flattened map arrays, -1 where pixel is not in map
+        """
+        if not hasattr(self, 'pix_index'):
+            self.set_pixel_index()
+        x0, y0 = self.pix_index_origin
+        x, y = np.broadcast_arrays(np.asarray(x) - x0, np.asarray(y) - y0)
+        inside = (x >= 0) & (x < self.pix_index.shape[1]) & (y >= 0) & (y < self.pix_index.shape[0])
+        ind = np.full(x.shape, -1, dtype=np.int64)
+        ind[inside] = self.pix_index[y[inside], x[inside]]
+        return ind
+
+    def set_precision(self, precision='single'):
+        """Set precision of map values (sim, snim), pointing matrix values (amat_data) and indices (sx_pix, sy_pix,
+        amat_row, amat_col, pix_index) and convert any existing arrays. 'single' stores values as float32 and indices
+        as int32 (unless the map or catalogue is too large for int32), roughly halving the memory used by the map and
+        pointing matrix. The precision is kept when the pointing matrix is recalculated or the prior is cut down.
+
+        :param precision: 'single' or 'double' (float64 values and int64 indices, the default)
+        """
+        if precision not in ('single', 'double'):
+            raise ValueError("precision must be 'single' or 'double', not {}".format(precision))
+        self.precision = precision
+        for key in ['sim', 'snim', 'amat_data']:
+            if hasattr(self, key):
+                setattr(self, key, np.asarray(getattr(self, key)).astype(self.float_dtype, copy=False))
+        for key in ['sx_pix', 'sy_pix', 'amat_row', 'amat_col', 'pix_index']:
+            if hasattr(self, key):
+                setattr(self, key, np.asarray(getattr(self, key)).astype(self.index_dtype, copy=False))
+
+    @property
+    def float_dtype(self):
+        """dtype of map and pointing matrix values, from precision"""
+        return np.float32 if self.precision == 'single' else np.float64
+
+    @property
+    def index_dtype(self):
+        """dtype of pixel and source indices, from precision and the size of the map and catalogue"""
+        if self.precision == 'single':
+            size = max(getattr(self, 'snpix', 0), getattr(self, 'nsrc', 0))
+            if hasattr(self, 'imhdu'):
+                size = max(size, self.imhdu.get('NAXIS1', 0), self.imhdu.get('NAXIS2', 0))
+            if size < np.iinfo(np.int32).max:
+                return np.int32
+        return np.int64
 
     def cut_down_cat(self):
         """Cuts down prior class variables associated with the catalogue data to the MOC assigned to the prior class: self.moc
         """
-        sgood = np.array(moc_routines.check_in_moc(self.sra, self.sdec, self.moc))
-
-        self.sx = self.sx[sgood]
-        self.sy = self.sy[sgood]
-        self.sra = self.sra[sgood]
-        self.sdec = self.sdec[sgood]
-        self.nsrc = sum(sgood)
-        self.ID = self.ID[sgood]
+        if hasattr(self, 'ssrc_hpidx'):
+            # catalogue sorted by HEALPix index (see sort_by_hpidx)
+            sgood = moc_routines.sorted_hpidx_in_moc(self.ssrc_hpidx, moc_routines.HPIDX_ORDER, self.moc)
+        else:
+            sgood = np.array(moc_routines.check_in_moc(self.sra, self.sdec, self.moc))
+        self.select_sources(sgood)
+
+    def select_sources(self, ind):
+        """Select sources, updating all variables associated with the catalogue data
+
+        :param ind: boolean mask or index array into catalogue arrays
+        """
+        self.sx = self.sx[ind]
+        self.sy = self.sy[ind]
+        self.sra = self.sra[ind]
+        self.sdec = self.sdec[ind]
+        self.nsrc = self.sra.size
+        self.ID = self.ID[ind]
+        if hasattr(self, 'ssrc_hpidx'):
+            self.ssrc_hpidx = self.ssrc_hpidx[ind]
         if hasattr(self, 'nstack'):
-            self.stack = self.stack[sgood]
+            self.stack = self.stack[ind]
             self.nstack = sum(self.stack)
         if hasattr(self, 'prior_flux_upper'):
-            self.prior_flux_upper = self.prior_flux_upper[sgood]
+            self.prior_flux_upper = self.prior_flux_upper[ind]
         if hasattr(self, 'prior_flux_lower'):
-            self.prior_flux_lower = self.prior_flux_lower[sgood]
+            self.prior_flux_lower = self.prior_flux_lower[ind]
         if hasattr(self,'z_median'):
-            self.z_median=self.z_median[sgood]
-            self.z_sig=self.z_sig[sgood]
+            self.z_median=self.z_median[ind]
+            self.z_sig=self.z_sig[ind]
+
+    def sort_by_hpidx(self):
+        """Sort map pixels and sources by HEALPix index (at order moc_routines.HPIDX_ORDER). Cutting down a sorted
+        prior to a MOC only reads the contiguous ranges of pixels and sources in the MOC, so a large master prior saved
+        with xidplus.io.save_columnar and memory mapped is never read in full. Any pointing matrix is renumbered.
+        """
+        if not hasattr(self, 'spix_hpidx'):
+            self.set_pixel_hpidx()
+        pix_order = np.argsort(self.spix_hpidx, kind='stable')
+        src_order = None
+        self.select_pixels(pix_order)
+        self.spix_hpidx_sorted = True
+        if hasattr(self, 'sra'):
+            self.ssrc_hpidx = moc_routines.coords_to_hpidx(self.sra, self.sdec, moc_routines.HPIDX_ORDER)
+            src_order = np.argsort(self.ssrc_hpidx, kind='stable')
+            self.select_sources(src_order)
+        if hasattr(self, 'amat_row'):
+            self.amat_row = np.argsort(pix_order)[self.amat_row]
+            if src_order is not None:
+                self.amat_col = np.argsort(src_order)[self.amat_col]
 
     def cut_down_prior(self):
 
@@ -76,6 +218,7 @@ class prior(object):
         self.snim = nim.flatten()
         self.sim = im.flatten()
         self.snpix = self.sim.size
+        self.set_pixel_hpidx()
         if moc is not None:
             self.moc = moc
             self.cut_down_map()
@@ -112,6 +255,7 @@ class prior(object):
 
 
         # Redefine prior list so it only contains sources in the map
+        self.__dict__.pop('ssrc_hpidx', None)
         self.sx = sx
         self.sy = sy
         self.sra = ra
@@ -161,6 +305,7 @@ class prior(object):
         # Redefine prior list so it only contains sources in the map
 
         # Redefine prior list so it only contains sources in the map
+        self.__dict__.pop('ssrc_hpidx', None)
         self.sx = np.append(self.sx, sx)
         self.sy = np.append(self.sy, sy)
         self.sra = np.append(self.sra, ra)
@@ -197,6 +342,50 @@ class prior(object):
         from scipy.sparse import coo_matrix
         self.A = coo_matrix((self.amat_data, (self.amat_row, self.amat_col)), shape=(self.snpix, self.nsrc))
 
+    def pointing_matrix_csr(self):
+        """Get scipy csr version of pointing matrix, cached until the pointing matrix, map or catalogue changes.
+        Useful for fast products with flux vectors (A*f)"""
+        return self.cached_pointing_matrix('csr')
+
+    def pointing_matrix_csc(self):
+        """Get scipy csc version of pointing matrix, cached until the pointing matrix, map or catalogue changes.
+        Useful for per source (column) operations"""
+        return self.cached_pointing_matrix('csc')
+
+    def cached_pointing_matrix(self, format):
+        """Get scipy sparse version of pointing matrix in given format, building it on first use.
+
+        The cache is cleared whenever the pointing matrix arrays or the map and catalogue sizes are set (see
+        __setattr__), including in place operations such as prior.amat_data *= k, so it is rebuilt when the pointing
+        matrix is recalculated or the prior is cut down (e.g. by set_tile). Call clear_pointing_matrix_cache after
+        changing elements of the arrays (e.g. prior.amat_data[i] = x).
+
+        :param format: scipy sparse format (e.g. 'csr', 'csc')
+        :return: scipy sparse matrix (snpix x nsrc)
+        """
+        from scipy.sparse import coo_matrix
+        cache = self.__dict__.setdefault('pointing_matrix_cache', {})
+        if format not in cache:
+            cache[format] = coo_matrix((self.amat_data, (self.amat_row, self.amat_col)),
+                                       shape=(self.snpix, self.nsrc)).asformat(format)
+        return cache[format]
+
+    def clear_pointing_matrix_cache(self):
+        """Remove cached sparse pointing matrices (see cached_pointing_matrix)"""
+        self.__dict__.pop('pointing_matrix_cache', None)
+
+    def __setattr__(self, name, value):
+        # cached sparse pointing matrices are out of date once the pointing matrix or map/catalogue sizes change
+        if name in ('amat_data', 'amat_row', 'amat_col', 'snpix', 'nsrc'):
+            self.clear_pointing_matrix_cache()
+        object.__setattr__(self, name, value)
+
+    def __getstate__(self):
+        # cached sparse pointing matrices are not saved, they are rebuilt on first use
+        state = self.__dict__.copy()
+        state.pop('pointing_matrix_cache', None)
+        return state
+
 
 
     def upper_lim_map(self):
@@ -204,10 +393,12 @@ class prior(object):
          where max(D) is maximum value of pixels the source contributes to"""
 
         self.prior_flux_upper = np.full((self.nsrc), 1000.0)
-        for i in range(0, self.nsrc):
-            ind = self.amat_col == i
-            if ind.sum() > 0:
-                self.prior_flux_upper[i] = np.max(self.sim[self.amat_row[ind]]) + (np.abs(self.bkg[0]) + 2 * self.bkg[1])
+        if self.amat_col.size > 0:
+            # max of map over pixels each source contributes to, as a reduction over columns of pointing matrix
+            A = self.pointing_matrix_csc()
+            src = np.flatnonzero(np.diff(A.indptr) > 0)
+            d_max = np.maximum.reduceat(self.sim[A.indices], A.indptr[src])
+            self.prior_flux_upper[src] = d_max + (np.abs(self.bkg[0]) + 2 * self.bkg[1])
 
     def get_pointing_matrix_unknown_psf(self, bkg=True):
         """Calculate pointing matrix for unknown psf. If bkg = True, bkg is fitted to all pixels. If False, bkg only fitted to where prior sources contribute
@@ -221,39 +412,101 @@ class prior(object):
 
         # ------Deal with PRF array----------
         centre = ((paxis1 - 1) / 2)
+        radius = self.pindx[-1] / 2.0
         # create pointing array
         for s in range(0, self.nsrc):
+            # map pixels in box around source, padded by a pixel either side
+            bx, by = np.meshgrid(np.arange(np.floor(self.sx[s] - radius) - 1, np.ceil(self.sx[s] + radius) + 2, dtype=int),
+                                 np.arange(np.floor(self.sy[s] - radius) - 1, np.ceil(self.sy[s] + radius) + 2, dtype=int))
+            box = self.pixel_lookup(bx, by).ravel()
+            box = np.sort(box[box >= 0])
 
             # diff from centre of beam for each pixel in x
-            dx =  self.sx_pix-self.sx[s]
+            dx =  self.sx_pix[box]-self.sx[s]
             # diff from centre of beam for each pixel in y
-            dy =  self.sy_pix -self.sy[s]
-            # diff from each pixel in prf
-            pindx = self.pindx - (paxis1 - 1.) / 2. + self.sx[s] - np.rint(self.sx[s]).astype(np.long)
-            pindy = self.pindy + self.sy[s] - np.rint(self.sy[s]).astype(np.long)
-            # diff from pixel centre
-            px = self.sx[s] - np.rint(self.sx[s]).astype(np.long) + (paxis1 - 1.) / 2.
-            py = self.sy[s] - np.rint(self.sy[s]).astype(np.long) + (paxis2 - 1.) / 2.
+            dy =  self.sy_pix[box] -self.sy[s]
 
             dist=np.sqrt(dx**2+dy**2)
-            good = dist < self.pindx[-1]/2.0
+            good = dist < radius
             ngood = good.sum()
-            bad = np.asarray(good) == False
-            nbad = bad.sum()
             if ngood > 0.5 * self.pindx[-1] * self.pindy[-1]:
-                f = interpolate.interp1d(self.pindx[0:(paxis1 + 1.) / 2],np.arange((paxis1 + 1.) / 2.),kind='nearest')
+                f = interpolate.interp1d(self.pindx[0:(paxis1 + 1) // 2],np.arange((paxis1 + 1) // 2),kind='nearest')
                 atemp=f(dist[good])
                 amat_data = np.append(amat_data, atemp)
-                amat_row = np.append(amat_row,
-                                     np.arange(0, self.snpix, dtype=int)[good])  # what pixels the source contributes to
+                amat_row = np.append(amat_row, box[good])  # what pixels the source contributes to
                 amat_col = np.append(amat_col, np.full(ngood, s))  # what source we are on
 
-        self.amat_data = amat_data
-        self.amat_row = amat_row
-        self.amat_col = amat_col
+        self.amat_data = amat_data.astype(self.float_dtype)
+        self.amat_row = amat_row.astype(self.index_dtype)
+        self.amat_col = amat_col.astype(self.index_dtype)
 
-    def get_pointing_matrix(self, bkg=True):
+    def get_pointing_matrix(self, bkg=True, batch_size=500):
         """Calculate pointing matrix. If bkg = True, bkg is fitted to all pixels. If False, bkg only fitted to where prior sources contribute
+
+        Sources are processed in batches and only the map pixels within the prf footprint of each source are visited.
+        The prf is looked up at the nearest prf pixel by integer indexing, giving the same result as
+        :func:`get_pointing_matrix_loop`.
+
+        :param batch_size: number of sources processed at once
+        """
+        paxis1, paxis2 = self.prf.shape
+        nsrc = np.asarray(self.sx).size
+
+        # centre of beam in terms of prf scale
+        cx = self.pindx[np.rint((paxis1 - 1.) / 2).astype(np.int64)]
+        cy = self.pindy[np.rint((paxis2 - 1.) / 2).astype(np.int64)]
+        # integer pixel offsets (relative to source pixel) that can fall within the prf, padded by a pixel either side
+        ox = np.arange(np.floor(-cx) - 1, np.ceil(self.pindx[paxis1 - 1] - cx) + 1).astype(np.int64)
+        oy = np.arange(np.floor(-cy) - 1, np.ceil(self.pindy[paxis2 - 1] - cy) + 1).astype(np.int64)
+
+        amat_data = []
+        amat_row = []
+        amat_col = []
+        for start in range(0, nsrc, batch_size):
+            s = np.arange(start, min(start + batch_size, nsrc))
+            sx = np.asarray(self.sx)[s]
+            sy = np.asarray(self.sy)[s]
+            rx = np.rint(sx).astype(np.int64)
+            ry = np.rint(sy).astype(np.int64)
+
+            # map pixels in footprint, diff from centre of beam for each pixel (batch x pixel)
+            px = rx[:, None] + ox[None, :]
+            py = ry[:, None] + oy[None, :]
+            dx = -rx[:, None] + cx + px
+            dy = -ry[:, None] + cy + py
+            goodx = (dx >= 0) & (dx < self.pindx[paxis1 - 1])
+            goody = (dy >= 0) & (dy < self.pindy[paxis2 - 1])
+
+            # nearest pixel in prf
+            ix = _nearest_index(self.pindx, sx, rx, dx)
+            iy = _nearest_index(self.pindy, sy, ry, dy)
+
+            # position of footprint pixels in flattened map arrays
+            flat = self.pixel_lookup(px[:, None, :], py[:, :, None])
+            good = goody[:, :, None] & goodx[:, None, :] & (flat >= 0)
+
+            atemp = self.prf[iy[:, :, None], ix[:, None, :]]
+            amax = np.where(good, atemp, -np.inf).max(axis=(1, 2))
+            keep = good & (atemp > amax[:, None, None] / 1.0E3)
+
+            b, j, i = np.nonzero(keep)
+            amat_data.append(atemp[b, j, i])
+            amat_row.append(flat[b, j, i])
+            amat_col.append(s[b])
+
+        amat_data = np.concatenate(amat_data).astype(self.float_dtype) if nsrc > 0 else np.array([], dtype=self.float_dtype)
+        amat_row = np.concatenate(amat_row).astype(self.index_dtype) if nsrc > 0 else np.array([], dtype=self.index_dtype)
+        amat_col = np.concatenate(amat_col).astype(self.index_dtype) if nsrc > 0 else np.array([], dtype=self.index_dtype)
+        # order by source, then by pixel
+        order = np.lexsort((amat_row, amat_col))
+
+        self.amat_data = amat_data[order]
+        self.amat_row = amat_row[order]
+        self.amat_col = amat_col[order]
+
+    def get_pointing_matrix_loop(self, bkg=True):
+        """Calculate pointing matrix one source at a time, interpolating the prf over all map pixels. Reference
+        implementation for :func:`get_pointing_matrix`
         """
         from scipy import interpolate
         paxis1, paxis2 = self.prf.shape
@@ -268,13 +521,13 @@ class prior(object):
         for s in range(0, self.nsrc):
 
             # diff from centre of beam for each pixel in x
-            dx = -np.rint(self.sx[s]).astype(np.long) + self.pindx[np.rint((paxis1 - 1.) / 2).astype(np.long)] + self.sx_pix
+            dx = -np.rint(self.sx[s]).astype(np.int64) + self.pindx[np.rint((paxis1 - 1.) / 2).astype(np.int64)] + self.sx_pix
             # diff from centre of beam for each pixel in y
-            dy = -np.rint(self.sy[s]).astype(np.long) + self.pindy[np.rint((paxis2 - 1.) / 2).astype(np.long)] + self.sy_pix
+            dy = -np.rint(self.sy[s]).astype(np.int64) + self.pindy[np.rint((paxis2 - 1.) / 2).astype(np.int64)] + self.sy_pix
 
             # diff from each pixel in prf
-            pindx = self.pindx + self.sx[s] - np.rint(self.sx[s]).astype(np.long)
-            pindy = self.pindy + self.sy[s] - np.rint(self.sy[s]).astype(np.long)
+            pindx = self.pindx + self.sx[s] - np.rint(self.sx[s]).astype(np.int64)
+            pindy = self.pindy + self.sy[s] - np.rint(self.sy[s]).astype(np.int64)
 
 
             good = (dx >= 0) & (dx < self.pindx[paxis1 - 1]) & (dy >= 0) & (dy < self.pindy[paxis2 - 1])
@@ -292,6 +545,6 @@ class prior(object):
                 amat_col = np.append(amat_col, np.full(keep.sum(), s))  # what source we are on
 
 
-        self.amat_data = amat_data
-        self.amat_row = amat_row
-        self.amat_col = amat_col
+        self.amat_data = amat_data.astype(self.float_dtype)
+        self.amat_row = amat_row.astype(self.index_dtype)
+        self.amat_col = amat_col.astype(self.index_dtype)
@@ -17,9 +17,10 @@ def spire_model(priors,sub=1):
     psw_plate = pyro.plate('psw_pixels', priors[0].sim.size, dim=-3, subsample_size=np.rint(sub*priors[0].sim.size).astype(int))
     pmw_plate = pyro.plate('pmw_pixels', priors[1].sim.size, dim=-3, subsample_size=np.rint(sub*priors[1].sim.size).astype(int))
     plw_plate = pyro.plate('plw_pixels', priors[2].sim.size, dim=-3, subsample_size=np.rint(sub*priors[2].sim.size).astype(int))
+    # torch sparse indices must be int64, values are used as stored if already float32 (see xidplus.prior.set_precision)
     pointing_matrices = [torch.sparse.FloatTensor(
-            torch.LongTensor([p.amat_row, p.amat_col]),
-            torch.Tensor(p.amat_data), torch.Size([p.snpix, p.nsrc])) for p in priors]
+            torch.from_numpy(np.vstack((p.amat_row, p.amat_col)).astype(np.int64)),
+            torch.as_tensor(p.amat_data, dtype=torch.float), torch.Size([p.snpix, p.nsrc])) for p in priors]
 
     bkg_prior = torch.tensor([p.bkg[0] for p in priors])
     bkg_prior_sig = torch.tensor([p.bkg[1] for p in priors])
@@ -37,18 +38,18 @@ def spire_model(priors,sub=1):
     db_hat_psw = torch.sparse.mm(pointing_matrices[0], f_vec[0, ...].unsqueeze(-1)) + bkg[0]
     db_hat_pmw = torch.sparse.mm(pointing_matrices[1].to_dense(), f_vec[1, ...].unsqueeze(-1)) + bkg[1]
     db_hat_plw = torch.sparse.mm(pointing_matrices[2].to_dense(), f_vec[2, ...].unsqueeze(-1)) + bkg[2]
-    sigma_tot_psw = torch.sqrt(torch.pow(torch.tensor(priors[0].snim), 2) + torch.pow(sigma_conf[0], 2))
-    sigma_tot_pmw = torch.sqrt(torch.pow(torch.tensor(priors[1].snim), 2) + torch.pow(sigma_conf[1], 2))
-    sigma_tot_plw = torch.sqrt(torch.pow(torch.tensor(priors[2].snim), 2) + torch.pow(sigma_conf[2], 2))
+    sigma_tot_psw = torch.sqrt(torch.pow(torch.as_tensor(priors[0].snim), 2) + torch.pow(sigma_conf[0], 2))
+    sigma_tot_pmw = torch.sqrt(torch.pow(torch.as_tensor(priors[1].snim), 2) + torch.pow(sigma_conf[1], 2))
+    sigma_tot_plw = torch.sqrt(torch.pow(torch.as_tensor(priors[2].snim), 2) + torch.pow(sigma_conf[2], 2))
     with psw_plate as ind_psw:
         psw_map = pyro.sample("obs_psw", dist.Normal(db_hat_psw.squeeze()[ind_psw], sigma_tot_psw[ind_psw]),
-                              obs=torch.tensor(priors[0].sim[ind_psw]))
+                              obs=torch.as_tensor(priors[0].sim[ind_psw]))
     with pmw_plate as ind_pmw:
         pmw_map = pyro.sample("obs_pmw", dist.Normal(db_hat_pmw.squeeze()[ind_pmw], sigma_tot_pmw[ind_pmw]),
-                              obs=torch.tensor(priors[1].sim[ind_pmw]))
+                              obs=torch.as_tensor(priors[1].sim[ind_pmw]))
     with plw_plate as ind_plw:
         plw_map = pyro.sample("obs_plw", dist.Normal(db_hat_plw.squeeze()[ind_plw], sigma_tot_plw[ind_plw]),
-                              obs=torch.tensor(priors[2].sim[ind_plw]))
+                              obs=torch.as_tensor(priors[2].sim[ind_plw]))
     return psw_map, pmw_map, plw_map
 
 
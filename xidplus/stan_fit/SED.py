@@ -1,5 +1,3 @@
-from numpy import long
-
 __author__ = 'pdh21'
 import os
 output_dir=os.getcwd()
@@ -45,43 +43,43 @@ def MIPS_PACS_SPIRE(phot_priors,sed_prior_model,chains=4,iter=1000,max_treedepth
         'db_psw': prior250.sim,
         'sigma_psw': prior250.snim,
         'Val_psw': prior250.amat_data,
-        'Row_psw': prior250.amat_row.astype(np.long),
-        'Col_psw': prior250.amat_col.astype(np.long),
+        'Row_psw': prior250.amat_row.astype(np.int32, copy=False),
+        'Col_psw': prior250.amat_col.astype(np.int32, copy=False),
         'npix_pmw': prior350.snpix,
         'nnz_pmw': prior350.amat_data.size,
         'db_pmw': prior350.sim,
         'sigma_pmw': prior350.snim,
         'Val_pmw': prior350.amat_data,
-        'Row_pmw': prior350.amat_row.astype(np.long),
-        'Col_pmw': prior350.amat_col.astype(np.long),
+        'Row_pmw': prior350.amat_row.astype(np.int32, copy=False),
+        'Col_pmw': prior350.amat_col.astype(np.int32, copy=False),
         'npix_plw': prior500.snpix,
         'nnz_plw': prior500.amat_data.size,
         'db_plw': prior500.sim,
         'sigma_plw': prior500.snim,
         'Val_plw': prior500.amat_data,
-        'Row_plw': prior500.amat_row.astype(np.long),
-        'Col_plw': prior500.amat_col.astype(np.long),
+        'Row_plw': prior500.amat_row.astype(np.int32, copy=False),
+        'Col_plw': prior500.amat_col.astype(np.int32, copy=False),
         'npix_mips24': prior24.snpix,
         'nnz_mips24': prior24.amat_data.size,
         'db_mips24': prior24.sim,
         'sigma_mips24': prior24.snim,
         'Val_mips24': prior24.amat_data,
-        'Row_mips24': prior24.amat_row.astype(np.long),
-        'Col_mips24': prior24.amat_col.astype(np.long),
+        'Row_mips24': prior24.amat_row.astype(np.int32, copy=False),
+        'Col_mips24': prior24.amat_col.astype(np.int32, copy=False),
         'npix_pacs100': prior100.snpix,
         'nnz_pacs100': prior100.amat_data.size,
         'db_pacs100': prior100.sim,
         'sigma_pacs100': prior100.snim,
         'Val_pacs100': prior100.amat_data,
-        'Row_pacs100': prior100.amat_row.astype(np.long),
-        'Col_pacs100': prior100.amat_col.astype(np.long),
+        'Row_pacs100': prior100.amat_row.astype(np.int32, copy=False),
+        'Col_pacs100': prior100.amat_col.astype(np.int32, copy=False),
         'npix_pacs160': prior160.snpix,
         'nnz_pacs160': prior160.amat_data.size,
         'db_pacs160': prior160.sim,
         'sigma_pacs160': prior160.snim,
         'Val_pacs160': prior160.amat_data,
-        'Row_pacs160': prior160.amat_row.astype(np.long),
-        'Col_pacs160': prior160.amat_col.astype(np.long),
+        'Row_pacs160': prior160.amat_row.astype(np.int32, copy=False),
+        'Col_pacs160': prior160.amat_col.astype(np.int32, copy=False),
         'nTemp': sed_prior_model.shape[0],
         'nz': sed_prior_model.shape[2],
         'nband': sed_prior_model.shape[1],
@@ -131,36 +129,36 @@ def PACS_SPIRE(phot_priors,sed_prior_model,chains=4,iter=1000,seed=1425,max_tree
         'db_psw': prior250.sim,
         'sigma_psw': prior250.snim,
         'Val_psw': prior250.amat_data,
-        'Row_psw': prior250.amat_row.astype(np.long),
-        'Col_psw': prior250.amat_col.astype(np.long),
+        'Row_psw': prior250.amat_row.astype(np.int32, copy=False),
+        'Col_psw': prior250.amat_col.astype(np.int32, copy=False),
         'npix_pmw': prior350.snpix,
         'nnz_pmw': prior350.amat_data.size,
         'db_pmw': prior350.sim,
         'sigma_pmw': prior350.snim,
         'Val_pmw': prior350.amat_data,
-        'Row_pmw': prior350.amat_row.astype(np.long),
-        'Col_pmw': prior350.amat_col.astype(np.long),
+        'Row_pmw': prior350.amat_row.astype(np.int32, copy=False),
+        'Col_pmw': prior350.amat_col.astype(np.int32, copy=False),
         'npix_plw': prior500.snpix,
         'nnz_plw': prior500.amat_data.size,
         'db_plw': prior500.sim,
         'sigma_plw': prior500.snim,
         'Val_plw': prior500.amat_data,
-        'Row_plw': prior500.amat_row.astype(np.long),
-        'Col_plw': prior500.amat_col.astype(np.long),
+        'Row_plw': prior500.amat_row.astype(np.int32, copy=False),
+        'Col_plw': prior500.amat_col.astype(np.int32, copy=False),
         'npix_pacs100': prior100.snpix,
         'nnz_pacs100': prior100.amat_data.size,
         'db_pacs100': prior100.sim,
         'sigma_pacs100': prior100.snim,
         'Val_pacs100': prior100.amat_data,
-        'Row_pacs100': prior100.amat_row.astype(np.long),
-        'Col_pacs100': prior100.amat_col.astype(np.long),
+        'Row_pacs100': prior100.amat_row.astype(np.int32, copy=False),
+        'Col_pacs100': prior100.amat_col.astype(np.int32, copy=False),
         'npix_pacs160': prior160.snpix,
         'nnz_pacs160': prior160.amat_data.size,
         'db_pacs160': prior160.sim,
         'sigma_pacs160': prior160.snim,
         'Val_pacs160': prior160.amat_data,
-        'Row_pacs160': prior160.amat_row.astype(np.long),
-        'Col_pacs160': prior160.amat_col.astype(np.long),
+        'Row_pacs160': prior160.amat_row.astype(np.int32, copy=False),
+        'Col_pacs160': prior160.amat_col.astype(np.int32, copy=False),
         'nTemp': sed_prior_model.shape[0],
         'nz': sed_prior_model.shape[2],
         'nband': sed_prior_model.shape[1],
@@ -207,29 +205,29 @@ def MIPS_SPIRE(phot_priors,sed_prior_model,chains=4,seed=5363,iter=1000,max_tree
         'db_psw': prior250.sim,
         'sigma_psw': prior250.snim,
         'Val_psw': prior250.amat_data,
-        'Row_psw': prior250.amat_row.astype(np.long),
-        'Col_psw': prior250.amat_col.astype(np.long),
+        'Row_psw': prior250.amat_row.astype(np.int32, copy=False),
+        'Col_psw': prior250.amat_col.astype(np.int32, copy=False),
         'npix_pmw': prior350.snpix,
         'nnz_pmw': prior350.amat_data.size,
         'db_pmw': prior350.sim,
         'sigma_pmw': prior350.snim,
         'Val_pmw': prior350.amat_data,
-        'Row_pmw': prior350.amat_row.astype(np.long),
-        'Col_pmw': prior350.amat_col.astype(np.long),
+        'Row_pmw': prior350.amat_row.astype(np.int32, copy=False),
+        'Col_pmw': prior350.amat_col.astype(np.int32, copy=False),
         'npix_plw': prior500.snpix,
         'nnz_plw': prior500.amat_data.size,
         'db_plw': prior500.sim,
         'sigma_plw': prior500.snim,
         'Val_plw': prior500.amat_data,
-        'Row_plw': prior500.amat_row.astype(np.long),
-        'Col_plw': prior500.amat_col.astype(np.long),
+        'Row_plw': prior500.amat_row.astype(np.int32, copy=False),
+        'Col_plw': prior500.amat_col.astype(np.int32, copy=False),
         'npix_mips24': prior24.snpix,
         'nnz_mips24': prior24.amat_data.size,
         'db_mips24': prior24.sim,
         'sigma_mips24': prior24.snim,
         'Val_mips24': prior24.amat_data,
-        'Row_mips24': prior24.amat_row.astype(np.long),
-        'Col_mips24': prior24.amat_col.astype(np.long),
+        'Row_mips24': prior24.amat_row.astype(np.int32, copy=False),
+        'Col_mips24': prior24.amat_col.astype(np.int32, copy=False),
         'nTemp': sed_prior_model.shape[0],
         'nz': sed_prior_model.shape[2],
         'nband': sed_prior_model.shape[1],
@@ -276,29 +274,29 @@ def MIPS_SPIRE_gen(phot_priors,sed_prior_model,chains=4,seed=5363,iter=1000,max_
         'db_psw': prior250.sim,
         'sigma_psw': prior250.snim,
         'Val_psw': prior250.amat_data,
-        'Row_psw': prior250.amat_row.astype(np.long),
-        'Col_psw': prior250.amat_col.astype(np.long),
+        'Row_psw': prior250.amat_row.astype(np.int32, copy=False),
+        'Col_psw': prior250.amat_col.astype(np.int32, copy=False),
         'npix_pmw': prior350.snpix,
         'nnz_pmw': prior350.amat_data.size,
         'db_pmw': prior350.sim,
         'sigma_pmw': prior350.snim,
         'Val_pmw': prior350.amat_data,
-        'Row_pmw': prior350.amat_row.astype(np.long),
-        'Col_pmw': prior350.amat_col.astype(np.long),
+        'Row_pmw': prior350.amat_row.astype(np.int32, copy=False),
+        'Col_pmw': prior350.amat_col.astype(np.int32, copy=False),
         'npix_plw': prior500.snpix,
         'nnz_plw': prior500.amat_data.size,
         'db_plw': prior500.sim,
         'sigma_plw': prior500.snim,
         'Val_plw': prior500.amat_data,
-        'Row_plw': prior500.amat_row.astype(np.long),
-        'Col_plw': prior500.amat_col.astype(np.long),
+        'Row_plw': prior500.amat_row.astype(np.int32, copy=False),
+        'Col_plw': prior500.amat_col.astype(np.int32, copy=False),
         'npix_mips24': prior24.snpix,
         'nnz_mips24': prior24.amat_data.size,
         'db_mips24': prior24.sim,
         'sigma_mips24': prior24.snim,
         'Val_mips24': prior24.amat_data,
-        'Row_mips24': prior24.amat_row.astype(np.long),
-        'Col_mips24': prior24.amat_col.astype(np.long),
+        'Row_mips24': prior24.amat_row.astype(np.int32, copy=False),
+        'Col_mips24': prior24.amat_col.astype(np.int32, copy=False),
         'nTemp': sed_prior_model.shape[0],
         'nz': sed_prior_model.shape[2],
         'nband': sed_prior_model.shape[1],
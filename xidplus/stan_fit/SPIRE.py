@@ -1,7 +1,6 @@
-from numpy import long
-
 __author__ = 'pdh21'
 import os
+import numpy as np
 output_dir=os.getcwd()
 import pystan
 import pickle
@@ -10,7 +9,7 @@ full_path = os.path.realpath(__file__)
 path, file = os.path.split(full_path)
 
 stan_path=os.path.split(os.path.split(path)[0])[0]+'/stan_models/'
-def all_bands(SPIRE_250,SPIRE_350,SPIRE_500,chains=4,iter=1000):
+def all_bands(SPIRE_250,SPIRE_350,SPIRE_500,chains=4,iter=1000,n_jobs=-1):
 
     """
     Fit the three SPIRE bands
@@ -20,6 +19,7 @@ def all_bands(SPIRE_250,SPIRE_350,SPIRE_500,chains=4,iter=1000):
     :param SPIRE_500: xidplus.prior class
     :param chains: number of chains
     :param iter: number of iterations
+    :param n_jobs: number of cores to run chains on (-1 uses all cores)
     :return: pystan fit object
     """
 
@@ -35,22 +35,22 @@ def all_bands(SPIRE_250,SPIRE_350,SPIRE_500,chains=4,iter=1000):
           'db_psw':SPIRE_250.sim,
           'sigma_psw':SPIRE_250.snim,
           'Val_psw':SPIRE_250.amat_data,
-          'Row_psw': SPIRE_250.amat_row.astype(long),
-          'Col_psw': SPIRE_250.amat_col.astype(long),
+          'Row_psw': SPIRE_250.amat_row.astype(np.int32, copy=False),
+          'Col_psw': SPIRE_250.amat_col.astype(np.int32, copy=False),
           'npix_pmw':SPIRE_350.snpix,
           'nnz_pmw':SPIRE_350.amat_data.size,
           'db_pmw':SPIRE_350.sim,
           'sigma_pmw':SPIRE_350.snim,
           'Val_pmw':SPIRE_350.amat_data,
-          'Row_pmw': SPIRE_350.amat_row.astype(long),
-          'Col_pmw': SPIRE_350.amat_col.astype(long),
+          'Row_pmw': SPIRE_350.amat_row.astype(np.int32, copy=False),
+          'Col_pmw': SPIRE_350.amat_col.astype(np.int32, copy=False),
           'npix_plw':SPIRE_500.snpix,
           'nnz_plw':SPIRE_500.amat_data.size,
           'db_plw':SPIRE_500.sim,
           'sigma_plw':SPIRE_500.snim,
           'Val_plw':SPIRE_500.amat_data,
-          'Row_plw': SPIRE_500.amat_row.astype(long),
-          'Col_plw': SPIRE_500.amat_col.astype(long)}
+          'Row_plw': SPIRE_500.amat_row.astype(np.int32, copy=False),
+          'Col_plw': SPIRE_500.amat_col.astype(np.int32, copy=False)}
 
     #see if model has already been compiled. If not, compile and save it
     model_file='/XID+SPIRE'
@@ -58,7 +58,7 @@ def all_bands(SPIRE_250,SPIRE_350,SPIRE_500,chains=4,iter=1000):
     sm = get_stancode(model_file)
 
 
-    fit = sm.sampling(data=XID_data,iter=iter,chains=chains,verbose=True)
+    fit = sm.sampling(data=XID_data,iter=iter,chains=chains,n_jobs=n_jobs,verbose=True)
     #return fit data
     return fit
 
@@ -87,22 +87,22 @@ def all_bands_log10(SPIRE_250,SPIRE_350,SPIRE_500,chains=4,iter=1000):
           'db_psw':SPIRE_250.sim,
           'sigma_psw':SPIRE_250.snim,
           'Val_psw':SPIRE_250.amat_data,
-          'Row_psw': SPIRE_250.amat_row.astype(long),
-          'Col_psw': SPIRE_250.amat_col.astype(long),
+          'Row_psw': SPIRE_250.amat_row.astype(np.int32, copy=False),
+          'Col_psw': SPIRE_250.amat_col.astype(np.int32, copy=False),
           'npix_pmw':SPIRE_350.snpix,
           'nnz_pmw':SPIRE_350.amat_data.size,
           'db_pmw':SPIRE_350.sim,
           'sigma_pmw':SPIRE_350.snim,
           'Val_pmw':SPIRE_350.amat_data,
-          'Row_pmw': SPIRE_350.amat_row.astype(long),
-          'Col_pmw': SPIRE_350.amat_col.astype(long),
+          'Row_pmw': SPIRE_350.amat_row.astype(np.int32, copy=False),
+          'Col_pmw': SPIRE_350.amat_col.astype(np.int32, copy=False),
           'npix_plw':SPIRE_500.snpix,
           'nnz_plw':SPIRE_500.amat_data.size,
           'db_plw':SPIRE_500.sim,
           'sigma_plw':SPIRE_500.snim,
           'Val_plw':SPIRE_500.amat_data,
-          'Row_plw': SPIRE_500.amat_row.astype(long),
-          'Col_plw': SPIRE_500.amat_col.astype(long)}
+          'Row_plw': SPIRE_500.amat_row.astype(np.int32, copy=False),
+          'Col_plw': SPIRE_500.amat_col.astype(np.int32, copy=False)}
 
     #see if model has already been compiled. If not, compile and save it
     model_file='/XID+logSPIRE'
@@ -1,5 +1,4 @@
 # init file for stan fit functions
-import xidplus.io as io
 
 __author__ = 'pdh21'
 import os
@@ -8,36 +7,126 @@ output_dir = os.getcwd()
 full_path = os.path.realpath(__file__)
 path, file = os.path.split(full_path)
 
-stan_path=os.path.split(os.path.split(path)[0])[0]+'/stan_models/'
 stan_path=os.path.split(os.path.split(path)[0])[0]+'/stan_models/'
 
-import pystan
 import pickle
-import inspect
+import hashlib
+from contextlib import contextmanager
+from functools import lru_cache
+
+# directory for compiled stan models, shared by all jobs. Set with set_cache_dir or the XIDPLUS_STAN_CACHE
+# environment variable
+cache_dir = os.environ.get('XIDPLUS_STAN_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'xidplus', 'stan'))
+
+
+def set_cache_dir(dirname):
+    """Set directory compiled stan models are cached in
+
+    :param dirname: directory, created when first needed. Should be on a filesystem shared by all jobs
+    """
+    global cache_dir
+    cache_dir = dirname
+
+
+@lru_cache(maxsize=None)
+def compiler_version():
+    """Version of pystan (and the Stan version it includes) and of the C++ compiler used to compile models, found once
+    per process
+
+    :return: version string
+    """
+    import subprocess
+    import sysconfig
+    try:
+        import pystan
+        version = 'pystan ' + pystan.__version__
+    except ImportError:
+        version = 'pystan not installed'
+    compiler = os.environ.get('CXX', sysconfig.get_config_var('CXX') or 'c++')
+    try:
+        compiler_output = subprocess.check_output(compiler.split()[0:1] + ['--version'], stderr=subprocess.DEVNULL)
+        version += '; ' + compiler_output.decode('ascii', 'replace').splitlines()[0]
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        version += '; ' + compiler
+    return version
+
+
+def model_hash(model_file):
+    """Hash of stan model source and compiler version, so a compiled model is reused until either changes
+
+    :param model_file: filename of stan model (without .stan extension), in stan_models directory
+    :return: hex digest
+    """
+    h = hashlib.sha256()
+    with open(stan_path + model_file.strip('/') + '.stan', 'rb') as f:
+        h.update(f.read())
+    h.update(compiler_version().encode('utf-8'))
+    return h.hexdigest()
+
+
+@contextmanager
+def locked(filename):
+    """Hold an exclusive lock on filename (created if needed) so that only one process at a time compiles a model.
+    Locking is skipped where fcntl is not available (e.g. Windows)
+    """
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    with open(filename, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def cached(cache_file, build):
+    """Load object pickled in cache file, or build it and save it to the cache file. The cache file is written by one
+    process at a time and replaced atomically, so concurrent jobs never read a partly written file. A cache file that
+    cannot be unpickled (e.g. corrupt, or pickled with modules no longer installed) is rebuilt and overwritten
+
+    :param cache_file: filename of cache
+    :param build: function returning object to cache
+    :return: object
+    """
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        pass
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+    with locked(cache_file + '.lock'):
+        # another job may have built it while we waited for the lock
+        try:
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            pass
+        obj = build()
+        tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(obj, f)
+        os.replace(tmp_file, cache_file)
+    return obj
 
 
 def get_stancode(model_file):
 
     """
-    Check if exisiting compiled stan code exists and matches current git version, otherwise compile and save.
-    
+    Get compiled stan model from cache (see set_cache_dir), compiling and saving it if the model source or compiler has
+    changed since it was last compiled.
+
     :param model_file: filename of stan model
-    :return: compiled stan code 
+    :return: compiled stan code
     """
-    try:
-        with open(output_dir+model_file+'.pkl', 'rb') as f:
-            # using the same model as before
-
-            obj = pickle.load(f)
-            sm=obj['sm']
-            if obj['version'] != io.git_version(): raise IOError
-            print("%s found. Reusing" % model_file)
-
-
-    except IOError as e:
-        print("%s not found or wrong version. Compiling" % model_file)
-        sm = pystan.StanModel(file=stan_path+model_file+'.stan')
-        # save it to the file 'model.pkl' for later use
-        with open(output_dir+model_file+'.pkl', 'wb') as f:
-            pickle.dump({'sm': sm, 'version': io.git_version()}, f)
-    return sm
+    import pystan
+    name = model_file.strip('/')
+    cache_file = os.path.join(cache_dir, '{}-{}.pkl'.format(name, model_hash(model_file)))
+
+    def compile_model():
+        print("%s not found in cache. Compiling" % name)
+        return pystan.StanModel(file=stan_path + name + '.stan')
+    return cached(cache_file, compile_model)